@@ -0,0 +1,308 @@
+import itertools
+
+LOOKUPS = {
+    'exact': '{field} = {value}',
+    'like': '{field} LIKE {value}',
+    'ilike': '{field} ILIKE {value}',
+    'in': '{field} = any({value})',
+    'in_set': '{field} IN (SELECT unnest({value}))',
+    'gt': '{field} > {value}',
+    'gte': '{field} >= {value}',
+    'lt': '{field} < {value}',
+    'lte': '{field} <= {value}',
+    'not_in': '{field} <> all({value})',
+    'between': '{field} BETWEEN {value} AND {value2}',
+    'isnull': '{field} IS NULL',
+    'notnull': '{field} IS NOT NULL',
+    'contains': '{field} @> {value}',
+    'contained_by': '{field} <@ {value}',
+    'overlap': '{field} && {value}',
+}
+LOOKUP_ARITY = {'between': 2, 'isnull': 0, 'notnull': 0}
+
+
+def placeholders(start=1):
+    return ('${}'.format(index) for index in itertools.count(start))
+
+
+class Parameter:
+    def build(self, params):
+        return next(params)
+
+
+class Condition:
+    def __init__(self, field, lookup='exact', cast=None):
+        if lookup not in LOOKUPS:
+            raise ValueError('Invalid lookup {!r}'.format(lookup))
+        self.field = field
+        self.lookup = lookup
+        self.cast = cast
+
+    def build(self, params):
+        arity = LOOKUP_ARITY.get(self.lookup, 1)
+        values = dict(zip(
+            ('value', 'value2'), (next(params) for _ in range(arity))
+        ))
+        if self.cast:
+            values['value'] = '{}::{}'.format(values['value'], self.cast)
+        return LOOKUPS[self.lookup].format(field=self.field, **values)
+
+
+class Where:
+    def __init__(self, conditions, operator='AND', negated=False):
+        self.conditions = conditions
+        self.operator = operator
+        self.negated = negated
+
+    def __bool__(self):
+        return any(self.conditions)
+
+    def get_conditions(self):
+        return [condition for condition in self.conditions if condition]
+
+    def build(self, params):
+        conditions = self.get_conditions()
+        parts = []
+        for condition in conditions:
+            sql = condition.build(params)
+            if (isinstance(condition, Where) and not condition.negated and
+                    len(condition.get_conditions()) > 1 and
+                    len(conditions) > 1):
+                sql = '({})'.format(sql)
+            parts.append(sql)
+        sql = ' {} '.format(self.operator).join(parts)
+        if self.negated and sql:
+            sql = 'NOT ({})'.format(sql)
+        return sql
+
+
+class Keyset:
+    def __init__(self, fields, order_by_sort='ASC'):
+        self.fields = fields
+        self.order_by_sort = order_by_sort
+
+    def build(self, params):
+        operator = '<' if self.order_by_sort.upper() == 'DESC' else '>'
+        return '({}) {} ({})'.format(
+            ', '.join(self.fields),
+            operator,
+            ', '.join(next(params) for _ in self.fields)
+        )
+
+
+class Join:
+    def __init__(self, table_name, source, target, join_type='INNER JOIN'):
+        self.table_name = table_name
+        self.source = source
+        self.target = target
+        self.join_type = join_type
+
+    def build(self):
+        return '{} {} ON {} = {}'.format(
+            self.join_type, self.table_name, self.source, self.target
+        )
+
+
+class Select:
+    def __init__(
+            self, table_name, fields=None, count=False, joins=None,
+            where=None, order_by=None, order_by_sort='ASC', limit=None,
+            offset=None):
+        self.table_name = table_name
+        self.fields = fields
+        self.count = count
+        self.joins = joins or []
+        self.where = where
+        self.order_by = order_by
+        self.order_by_sort = order_by_sort
+        self.limit = limit
+        self.offset = offset
+
+    def build(self, params=None):
+        params = params or placeholders()
+        if self.count:
+            columns = 'COUNT(1)'
+        else:
+            columns = ', '.join(self.fields) if self.fields else '*'
+        parts = ['SELECT', columns, 'FROM', self.table_name]
+        parts.extend(join.build() for join in self.joins)
+        if self.where:
+            parts.extend(('WHERE', self.where.build(params)))
+        if self.order_by:
+            parts.extend(('ORDER BY', self.build_order_by()))
+        if self.limit:
+            parts.append(
+                'LIMIT {}'.format(self.build_value(self.limit, params))
+            )
+        if self.offset:
+            parts.append(
+                'OFFSET {}'.format(self.build_value(self.offset, params))
+            )
+        return ' '.join(parts)
+
+    def build_value(self, value, params):
+        if isinstance(value, Parameter):
+            return value.build(params)
+        return value
+
+    def build_order_by(self):
+        if isinstance(self.order_by, str):
+            return '{} {}'.format(self.order_by, self.order_by_sort)
+        return ', '.join(
+            '{} {}'.format(field, self.order_by_sort)
+            for field in self.order_by
+        )
+
+
+class Insert:
+    def __init__(self, table_name, field_names, rows=1, returning='*'):
+        self.table_name = table_name
+        self.field_names = field_names
+        self.rows = rows
+        self.returning = returning
+
+    def build(self, params=None):
+        params = params or placeholders()
+        sql = 'INSERT INTO {} ({}) VALUES {}'.format(
+            self.table_name,
+            ', '.join(self.field_names),
+            ', '.join(
+                '({})'.format(
+                    ', '.join(next(params) for _ in self.field_names)
+                )
+                for _ in range(self.rows)
+            ),
+        )
+        if self.returning:
+            sql += ' RETURNING {}'.format(self.returning)
+        return sql
+
+
+class Update:
+    def __init__(self, table_name, field_names, where, returning='*'):
+        self.table_name = table_name
+        self.field_names = field_names
+        self.where = where
+        self.returning = returning
+
+    def build(self, params=None):
+        params = params or placeholders()
+        sql = 'UPDATE {} SET {} WHERE {}'.format(
+            self.table_name,
+            ', '.join(
+                '{} = {}'.format(field_name, next(params))
+                for field_name in self.field_names
+            ),
+            self.where.build(params),
+        )
+        if self.returning:
+            sql += ' RETURNING {}'.format(self.returning)
+        return sql
+
+
+class Delete:
+    def __init__(self, table_name, where, returning=None):
+        self.table_name = table_name
+        self.where = where
+        self.returning = returning
+
+    def build(self, params=None):
+        params = params or placeholders()
+        sql = 'DELETE FROM {} WHERE {}'.format(
+            self.table_name, self.where.build(params)
+        )
+        if self.returning:
+            sql += ' RETURNING {}'.format(self.returning)
+        return sql
+
+
+class Unnest:
+    def __init__(self, field_names, field_types, alias=None):
+        self.field_names = field_names
+        self.field_types = field_types
+        self.alias = alias
+
+    def build(self, params):
+        sql = 'unnest({})'.format(', '.join(
+            '{}::{}[]'.format(next(params), field_type)
+            for field_type in self.field_types
+        ))
+        if self.alias:
+            sql += ' AS {} ({})'.format(
+                self.alias, ', '.join(self.field_names)
+            )
+        return sql
+
+
+class BulkUpdate:
+    def __init__(
+            self, table_name, key_field, field_names, field_types,
+            returning='*'):
+        if not any(
+                field_name != key_field for field_name in field_names):
+            raise ValueError(
+                'No fields to update besides {!r}'.format(key_field)
+            )
+        self.table_name = table_name
+        self.key_field = key_field
+        self.field_names = field_names
+        self.field_types = field_types
+        self.returning = returning
+
+    def build(self, params=None):
+        params = params or placeholders()
+        alias = 'bulk_data'
+        sql = (
+            'UPDATE {table} SET {fields} FROM {source} '
+            'WHERE {table}.{key} = {alias}.{key}'
+        ).format(
+            table=self.table_name,
+            fields=', '.join(
+                '{field} = {alias}.{field}'.format(
+                    field=field_name, alias=alias
+                )
+                for field_name in self.field_names
+                if field_name != self.key_field
+            ),
+            source=Unnest(
+                self.field_names, self.field_types, alias
+            ).build(params),
+            key=self.key_field,
+            alias=alias,
+        )
+        if self.returning:
+            sql += ' RETURNING {}.{}'.format(self.table_name, self.returning)
+        return sql
+
+
+class Upsert:
+    def __init__(
+            self, table_name, field_names, field_types, conflict_target,
+            update_fields=None, returning='*'):
+        self.table_name = table_name
+        self.field_names = field_names
+        self.field_types = field_types
+        self.conflict_target = conflict_target
+        self.update_fields = update_fields
+        self.returning = returning
+
+    def build(self, params=None):
+        params = params or placeholders()
+        if self.update_fields:
+            action = 'DO UPDATE SET {}'.format(', '.join(
+                '{field} = EXCLUDED.{field}'.format(field=field_name)
+                for field_name in self.update_fields
+            ))
+        else:
+            action = 'DO NOTHING'
+        sql = 'INSERT INTO {} ({}) SELECT * FROM {} ON CONFLICT ({}) {}'
+        sql = sql.format(
+            self.table_name,
+            ', '.join(self.field_names),
+            Unnest(self.field_names, self.field_types).build(params),
+            ', '.join(self.conflict_target),
+            action,
+        )
+        if self.returning:
+            sql += ' RETURNING {}'.format(self.returning)
+        return sql
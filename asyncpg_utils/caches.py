@@ -0,0 +1,139 @@
+import abc
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize=128, on_evict=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return value
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            evicted_key, evicted_value = self.data.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(evicted_key, evicted_value)
+        return value
+
+    def delete(self, key):
+        try:
+            del self.data[key]
+        except KeyError:
+            return False
+        return True
+
+    def clear(self):
+        data, self.data = self.data, OrderedDict()
+        if self.on_evict is not None:
+            for key, value in data.items():
+                self.on_evict(key, value)
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+        }
+
+
+class AbstractCache:
+    @abc.abstractmethod
+    async def get(self, key):
+        """A coroutine that returns the cached value or None."""
+
+    @abc.abstractmethod
+    async def set(self, key, value, ttl=None):
+        """A coroutine that stores a value, expiring after ttl seconds."""
+
+    @abc.abstractmethod
+    async def delete(self, *keys):
+        """A coroutine that removes keys from the cache."""
+
+    @abc.abstractmethod
+    async def clear(self):
+        """A coroutine that removes every key from the cache."""
+
+
+class MemoryCache(AbstractCache):
+    def __init__(self, maxsize=1024, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    async def get(self, key):
+        try:
+            value, expires_at = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        if expires_at is not None and expires_at <= self.clock():
+            del self.data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self.clock() + ttl if ttl else None
+        self.data[key] = (value, expires_at)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def clear(self):
+        self.data.clear()
+
+    def info(self):
+        requests = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self.data),
+            'maxsize': self.maxsize,
+        }
@@ -1,18 +1,434 @@
 import abc
+import asyncio
+import itertools
+import random
+import re
+import time
 
 import asyncpg
 
+try:
+    import contextvars
+except ImportError:  # Python < 3.7
+    contextvars = None
+
+from .builders import Insert
+from .metrics import NullMetricsCollector
+from .observers import QueryEvent, get_row_count, logger
+
+MAX_QUERY_ARGUMENTS = 32767
+READ_QUERY = re.compile(r'^\s*SELECT\b', re.IGNORECASE)
+LOCKING_CLAUSE = re.compile(
+    r'\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE
+)
+REPLICA_LAG_QUERY = (
+    'SELECT COALESCE(CASE WHEN pg_last_wal_receive_lsn() = '
+    'pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM now() - '
+    'pg_last_xact_replay_timestamp()) END, 0)'
+)
+
+
+def get_row_values(row, columns, exact=True):
+    keys = row.keys()
+    if (exact and keys != set(columns)) or any(
+            column not in keys for column in columns):
+        raise ValueError(
+            'Rows must have the keys {!r}, got {!r}'.format(
+                list(columns), list(keys)
+            )
+        )
+    return tuple(row[column] for column in columns)
+
+
+def in_transaction(connection):
+    try:
+        return not connection.is_closed() and connection.is_in_transaction()
+    except asyncpg.InterfaceError:
+        return False
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ConnectionContext:
+    def __init__(
+            self, database, connection=None, close_connection=True,
+            transaction=False):
+        self.database = database
+        self.connection = connection
+        self.close_connection = close_connection
+        self.use_transaction = transaction
+        self.transaction = None
+
+    async def __aenter__(self):
+        if self.connection is None:
+            self.connection = await self.database.get_connection()
+        if self.use_transaction and not self.connection.is_in_transaction():
+            self.transaction = self.connection.transaction()
+            try:
+                await self.transaction.start()
+            except Exception:
+                await self.release()
+                raise
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if self.transaction is not None:
+                if exc_type is None:
+                    await self.transaction.commit()
+                else:
+                    await self.transaction.rollback()
+        finally:
+            await self.release()
+        if self.transaction is not None:
+            await self.database.run_after_transaction(self.connection)
+
+    async def release(self):
+        if self.close_connection:
+            await self.database.release_connection(self.connection)
+
+
+class UnitOfWork:
+    def __init__(
+            self, database, connection=None, close_connection=True,
+            defer=True):
+        self.context = database.acquire(
+            connection, close_connection, transaction=True
+        )
+        self.connection = None
+        self.defer = defer
+        self.operations = []
+
+    @property
+    def kwargs(self):
+        return {'connection': self.connection, 'close_connection': False}
+
+    async def __aenter__(self):
+        self.connection = await self.context.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            try:
+                await self.flush()
+            except BaseException as error:
+                await self.context.__aexit__(
+                    type(error), error, error.__traceback__
+                )
+                raise
+        self.operations = []
+        await self.context.__aexit__(exc_type, exc, tb)
+
+    def add_operation(self, table_manager, kind, fields, item, pk=None):
+        if self.operations:
+            operation = self.operations[-1]
+            if (operation[0] is table_manager and operation[1] == kind and
+                    operation[2] == fields and pk not in operation[4]):
+                operation[3].append(item)
+                if pk is not None:
+                    operation[4].add(pk)
+                return
+        self.operations.append((
+            table_manager, kind, fields, [item],
+            set() if pk is None else {pk}
+        ))
+
+    async def create(self, table_manager, data):
+        """Returns the created row, or None when the insert is deferred."""
+        if not self.defer:
+            return await table_manager.create(data, **self.kwargs)
+        self.add_operation(table_manager, 'create', tuple(data), dict(data))
+
+    async def update(self, table_manager, pk, data):
+        if not self.defer:
+            return await table_manager.update(pk, data, **self.kwargs)
+        row = dict(data)
+        row[table_manager.pk_field] = pk
+        self.add_operation(table_manager, 'update', tuple(row), row, pk)
+
+    async def delete(self, table_manager, pk):
+        if not self.defer:
+            return await table_manager.delete(pk, **self.kwargs)
+        self.add_operation(table_manager, 'delete', (), pk, pk)
+
+    async def trigger_hooks(self, table_manager, event_name, items):
+        for item in items:
+            await table_manager.trigger_hooks(event_name, *item)
+
+    async def flush(self):
+        # Deferred writes go through the bulk methods, the per row hooks
+        # are dispatched here so they fire as they would without defer.
+        operations, self.operations = self.operations, []
+        for table_manager, kind, _, items, _ in operations:
+            post_event = 'post_' + kind
+            returning = bool(table_manager.get_hook_handlers(post_event))
+            if kind == 'create':
+                await self.trigger_hooks(
+                    table_manager, 'pre_create', [(item,) for item in items]
+                )
+                rows = await table_manager.bulk_create(
+                    items, returning=returning, **self.kwargs
+                )
+            elif kind == 'update':
+                pk_field = table_manager.pk_field
+                await self.trigger_hooks(table_manager, 'pre_update', [(
+                    item[pk_field],
+                    {key: value for key, value in item.items()
+                     if key != pk_field}
+                ) for item in items])
+                rows = await table_manager.bulk_update(
+                    items, returning=returning, **self.kwargs
+                )
+            else:
+                await self.trigger_hooks(
+                    table_manager, 'pre_delete', [(pk,) for pk in items]
+                )
+                await table_manager.delete_many(items, **self.kwargs)
+                rows = items
+            if returning:
+                await self.trigger_hooks(
+                    table_manager, post_event, [(row,) for row in rows]
+                )
+
+
+class Stream:
+    def __init__(
+            self, database, sql_query, *args, prefetch=None, connection=None,
+            timeout=None, close_connection=True):
+        # cursors need a transaction, the read only stream is not a write
+        self.context = ConnectionContext(
+            database, connection, close_connection, transaction=True
+        )
+        self.sql_query = sql_query
+        self.args = args
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.iterator = None
+        self.closed = False
+
+    async def __aenter__(self):
+        connection = await self.context.__aenter__()
+        try:
+            self.iterator = connection.cursor(
+                self.sql_query, *self.args, prefetch=self.prefetch,
+                timeout=self.timeout
+            ).__aiter__()
+        except BaseException as exc:
+            await self.context.__aexit__(type(exc), exc, exc.__traceback__)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.iterator is not None and not self.closed:
+            self.closed = True
+            await self.context.__aexit__(exc_type, exc, tb)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.iterator is None:
+            raise RuntimeError('Stream must be entered with "async with"')
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.iterator.__anext__()
+
 
 class AbstractDatabase:
+    statement_registry = None
+    metrics = NullMetricsCollector()
+    observers = ()
+    checked_out = None
+    after_transaction = None
+
     @abc.abstractmethod
     async def get_connection(self):
         """A coroutine that returns a connection to database."""
 
     @abc.abstractmethod
+    async def release_connection(self, connection):
+        """A coroutine that gives back a connection from get_connection."""
+
+    async def get_query_connection(self, coroutine_name, sql_query):
+        return await self.get_connection()
+
+    def get_idle_connections(self):
+        return None
+
+    @property
+    def connections_in_use(self):
+        checked_out = self.checked_out
+        if not checked_out:
+            return 0
+        # connections closed by their callers are never released
+        for connection in [
+                conn for conn in checked_out if conn.is_closed()]:
+            checked_out.discard(connection)
+        return len(checked_out)
+
+    def track_connection(self, connection):
+        if self.checked_out is None:
+            self.checked_out = set()
+        self.checked_out.add(connection)
+
+    def untrack_connection(self, connection):
+        if self.checked_out is not None:
+            self.checked_out.discard(connection)
+
+    def call_after_transaction(self, connection, callback):
+        if not in_transaction(connection):
+            return False
+        if self.after_transaction is None:
+            self.after_transaction = {}
+        callbacks = self.after_transaction.get(connection)
+        if callbacks is None:
+            # connections released outside the api never run theirs
+            for stale_connection in [
+                    conn for conn in self.after_transaction
+                    if not in_transaction(conn)]:
+                del self.after_transaction[stale_connection]
+            callbacks = self.after_transaction[connection] = []
+        callbacks.append(callback)
+        return True
+
+    async def run_after_transaction(self, connection):
+        if self.after_transaction:
+            for callback in self.after_transaction.pop(connection, ()):
+                await callback()
+
+    def report_connections(self):
+        if self.metrics.enabled:
+            self.metrics.set_connections(
+                self.connections_in_use, self.get_idle_connections()
+            )
+
+    async def observe_connection(self, awaitable):
+        metrics = self.metrics
+        if not metrics.enabled:
+            connection = await awaitable
+        else:
+            start = time.perf_counter()
+            try:
+                connection = await awaitable
+            except asyncio.TimeoutError:
+                metrics.increment_timeout('acquire')
+                raise
+            metrics.observe_acquire(time.perf_counter() - start)
+        self.track_connection(connection)
+        self.report_connections()
+        return connection
+
+    def observe_release(self, connection):
+        self.untrack_connection(connection)
+        self.report_connections()
+
+    def acquire(
+            self, connection=None, close_connection=True, transaction=False):
+        return ConnectionContext(
+            self, connection, close_connection, transaction
+        )
+
+    def unit_of_work(
+            self, connection=None, close_connection=True, defer=True):
+        return UnitOfWork(self, connection, close_connection, defer)
+
+    def add_observer(self, observer):
+        self.observers = tuple(self.observers) + (observer,)
+
+    def remove_observer(self, observer):
+        self.observers = tuple(
+            item for item in self.observers if item != observer
+        )
+
+    def notify_observers(self, event):
+        for observer in self.observers:
+            try:
+                observer(event)
+            except Exception:
+                logger.exception('observer %r failed', observer)
+
     async def call_connection_coroutine(
             self, coroutine_name, sql_query, *args, connection=None,
             timeout=None, close_connection=True):
         """A coroutine that executes another coroutine inside connection."""
+        if self.observers:
+            return await self.call_observed_connection_coroutine(
+                coroutine_name, sql_query, *args, connection=connection,
+                timeout=timeout, close_connection=close_connection
+            )
+        conn = connection or await self.get_query_connection(
+            coroutine_name, sql_query
+        )
+        try:
+            return await self.execute_connection_coroutine(
+                conn, coroutine_name, sql_query, *args, timeout=timeout
+            )
+        finally:
+            if close_connection:
+                await self.release_connection(conn)
+
+    async def call_observed_connection_coroutine(
+            self, coroutine_name, sql_query, *args, connection=None,
+            timeout=None, close_connection=True):
+        start = time.perf_counter()
+        conn = connection or await self.get_query_connection(
+            coroutine_name, sql_query
+        )
+        wait_time = time.perf_counter() - start
+        result = error = None
+        try:
+            result = await self.execute_connection_coroutine(
+                conn, coroutine_name, sql_query, *args, timeout=timeout
+            )
+            return result
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            duration = time.perf_counter() - start - wait_time
+            connection_id = conn.get_server_pid()
+            if close_connection:
+                await self.release_connection(conn)
+            self.notify_observers(QueryEvent(
+                coroutine_name, sql_query, len(args),
+                get_row_count(coroutine_name, result), connection_id,
+                wait_time, duration, error
+            ))
+
+    async def execute_connection_coroutine(
+            self, connection, coroutine_name, sql_query, *args, timeout=None):
+        metrics = self.metrics
+        if not metrics.enabled:
+            return await self.run_connection_coroutine(
+                connection, coroutine_name, sql_query, *args, timeout=timeout
+            )
+        start = time.perf_counter()
+        try:
+            return await self.run_connection_coroutine(
+                connection, coroutine_name, sql_query, *args, timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            metrics.increment_timeout('query')
+            raise
+        finally:
+            metrics.observe_query(sql_query, time.perf_counter() - start)
+
+    async def run_connection_coroutine(
+            self, connection, coroutine_name, sql_query, *args, timeout=None):
+        statement_registry = self.statement_registry
+        if statement_registry is not None and sql_query in statement_registry:
+            return await statement_registry.execute(
+                connection, coroutine_name, sql_query, *args, timeout=timeout
+            )
+        conn_coroutine = getattr(connection, coroutine_name)
+        return await conn_coroutine(sql_query, *args, timeout=timeout)
 
     async def query(
             self, sql_query, *args, connection=None, timeout=None,
@@ -30,6 +446,22 @@ class AbstractDatabase:
             timeout=timeout, close_connection=close_connection
         )
 
+    def stream(
+            self, sql_query, *args, prefetch=None, connection=None,
+            timeout=None, close_connection=True):
+        return Stream(
+            self, sql_query, *args, prefetch=prefetch, connection=connection,
+            timeout=timeout, close_connection=close_connection
+        )
+
+    async def execute(
+            self, sql_query, *args, connection=None, timeout=None,
+            close_connection=True):
+        return await self.call_connection_coroutine(
+            'execute', sql_query, *args, connection=connection,
+            timeout=timeout, close_connection=close_connection
+        )
+
     async def insert(
             self, table_name, data, connection=None, timeout=None,
             close_connection=True):
@@ -51,47 +483,385 @@ class AbstractDatabase:
             timeout=timeout, close_connection=close_connection
         )
 
+    async def bulk_insert(
+            self, table_name, rows, columns=None, returning=False,
+            batch_size=10000, connection=None, timeout=None,
+            close_connection=True):
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            return [] if returning else 0
+        exact = columns is None
+        if exact:
+            if not hasattr(first_row, 'keys'):
+                raise ValueError('columns is required for tuple rows')
+            columns = list(first_row.keys())
+        rows = itertools.chain((first_row,), rows)
+        if isinstance(first_row, dict):
+            rows = (get_row_values(row, columns, exact) for row in rows)
+        if returning:
+            batch_size = min(batch_size, MAX_QUERY_ARGUMENTS // len(columns))
+
+        result = [] if returning else 0
+        async with self.acquire(
+                connection, close_connection, transaction=True) as conn:
+            for batch in chunks(rows, batch_size):
+                if returning:
+                    result.extend(await self.insert_values(
+                        table_name, columns, batch, connection=conn,
+                        timeout=timeout
+                    ))
+                else:
+                    result += await self.copy_records(
+                        table_name, columns, batch, connection=conn,
+                        timeout=timeout
+                    )
+        return result
+
+    async def export(
+            self, sql_query, *args, output, format='csv', connection=None,
+            timeout=None, close_connection=True, **options):
+        write = getattr(output, 'write', None)
+        if write is not None and asyncio.iscoroutinefunction(write):
+            output = write
+        async with self.acquire(connection, close_connection) as conn:
+            status = await conn.copy_from_query(
+                sql_query, *args, output=output, format=format,
+                timeout=timeout, **options
+            )
+        return int(status.split()[-1])
+
+    async def copy_records(
+            self, table_name, columns, records, connection, timeout=None):
+        schema_name = None
+        if '.' in table_name:
+            schema_name, table_name = table_name.split('.', 1)
+        await connection.copy_records_to_table(
+            table_name, records=records, columns=columns,
+            schema_name=schema_name, timeout=timeout
+        )
+        return len(records)
+
+    async def insert_values(
+            self, table_name, columns, records, connection, timeout=None):
+        sql_query = Insert(
+            table_name,
+            ['"{}"'.format(column) for column in columns],
+            rows=len(records)
+        ).build()
+        values = [value for record in records for value in record]
+        return await self.call_connection_coroutine(
+            'fetch', sql_query, *values, connection=connection,
+            timeout=timeout, close_connection=False
+        )
+
 
 class Database(AbstractDatabase):
-    def __init__(self, dsn, **kwargs):
+    def __init__(
+            self, dsn, statement_registry=None, metrics=None,
+            reuse_connection=False, health_check_interval=None, **kwargs):
         self.dsn = dsn
+        self.statement_registry = statement_registry
+        self.metrics = metrics or self.metrics
+        self.reuse_connection = reuse_connection
+        self.health_check_interval = health_check_interval
         self.kwargs = kwargs
+        self.shared_connection = None
+        self.shared_connection_busy = False
+        self.shared_connection_released_at = 0
 
-    async def get_connection(self):
+    async def connect(self):
         return await asyncpg.connect(self.dsn, **self.kwargs)
 
-    async def call_connection_coroutine(
-            self, coroutine_name, sql_query, *args, connection=None,
-            timeout=None, close_connection=True):
-        conn = connection or await self.get_connection()
-        conn_coroutine = getattr(conn, coroutine_name)
+    def get_idle_connections(self):
+        if not self.reuse_connection:
+            return None
+        return int(
+            self.shared_connection is not None
+            and not self.shared_connection_busy
+        )
+
+    async def get_connection(self):
+        connection = self.shared_connection
+        if (self.shared_connection_busy and connection is not None and
+                connection.is_closed()):
+            # closed by its caller instead of release_connection
+            self.shared_connection = None
+            self.shared_connection_busy = False
+        if self.reuse_connection and not self.shared_connection_busy:
+            self.shared_connection_busy = True
+            return await self.observe_connection(self.get_shared_connection())
+        return await self.observe_connection(self.connect())
+
+    async def get_shared_connection(self):
+        try:
+            connection = self.shared_connection
+            if (connection is None or
+                    not await self.check_connection(connection)):
+                self.shared_connection = None
+                connection = self.shared_connection = await self.connect()
+            return connection
+        except BaseException:
+            self.shared_connection_busy = False
+            raise
+
+    async def check_connection(self, connection):
+        if connection.is_closed():
+            return False
+        idle_time = time.monotonic() - self.shared_connection_released_at
+        if (self.health_check_interval is None or
+                idle_time < self.health_check_interval):
+            return True
         try:
-            return await conn_coroutine(sql_query, *args, timeout=timeout)
+            await connection.fetchval('SELECT 1')
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError):
+            connection.terminate()
+            return False
+        return True
+
+    async def release_connection(self, connection):
+        try:
+            if connection is self.shared_connection:
+                await self.release_shared_connection(connection)
+            else:
+                await connection.close()
         finally:
-            if close_connection:
-                await conn.close()
+            self.observe_release(connection)
+        await self.run_after_transaction(connection)
+
+    async def release_shared_connection(self, connection):
+        try:
+            if connection.is_closed():
+                self.shared_connection = None
+            elif connection.is_in_transaction():
+                self.shared_connection = None
+                await connection.close()
+        finally:
+            self.shared_connection_busy = False
+            self.shared_connection_released_at = time.monotonic()
+
+    async def close(self):
+        connection, self.shared_connection = self.shared_connection, None
+        if connection is not None:
+            await connection.close()
+
+
+class Replica:
+    def __init__(self, dsn, weight=1, pool=None):
+        self.dsn = dsn
+        self.weight = weight
+        self.pool = pool
+        self.lag = None
 
 
 class PoolDatabase(AbstractDatabase):
-    def __init__(self, dsn, pool=None, **kwargs):
+    def __init__(
+            self, dsn, pool=None, statement_registry=None, metrics=None,
+            replicas=None, read_your_writes=0, max_replica_lag=None,
+            replica_check_interval=5, replica_check_timeout=1,
+            acquire_timeout=None, **kwargs):
         self.dsn = dsn
         self.pool = pool
+        self.statement_registry = statement_registry
+        self.metrics = metrics or self.metrics
+        self.replicas = [
+            self.make_replica(replica) for replica in replicas or []
+        ]
+        self.read_your_writes = read_your_writes
+        self.max_replica_lag = max_replica_lag
+        self.replica_check_interval = replica_check_interval
+        self.replica_check_timeout = replica_check_timeout
+        self.acquire_timeout = acquire_timeout
+        self.replicas_checked_at = None
+        self.replicas_check_task = None
+        self.replica_connections = {}
+        # read_your_writes applies to the task that wrote and the tasks it
+        # starts afterwards, without contextvars it is process wide
+        if contextvars is not None:
+            self.last_write = contextvars.ContextVar(
+                'last_write_at_{}'.format(id(self)), default=None
+            )
+        else:
+            self.last_write = None
+        self.last_write_at = None
         self.kwargs = kwargs
 
+    @property
+    def last_write_at(self):
+        if self.last_write is None:
+            return self.process_last_write_at
+        return self.last_write.get()
+
+    @last_write_at.setter
+    def last_write_at(self, value):
+        if self.last_write is None:
+            self.process_last_write_at = value
+        else:
+            self.last_write.set(value)
+
+    def make_replica(self, replica):
+        if isinstance(replica, Replica):
+            return replica
+        if isinstance(replica, str):
+            return Replica(replica)
+        return Replica(*replica)
+
     async def init_pool(self):
         if self.pool is None:
             self.pool = await asyncpg.create_pool(self.dsn, **self.kwargs)
+        for replica in self.replicas:
+            if replica.pool is None:
+                replica.pool = await asyncpg.create_pool(
+                    replica.dsn, **self.kwargs
+                )
+        if self.replicas and self.max_replica_lag is not None:
+            await self.check_replicas()
+
+    async def close(self):
+        task, self.replicas_check_task = self.replicas_check_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        for pool in [self.pool] + [replica.pool for replica in self.replicas]:
+            if pool is not None:
+                await pool.close()
+
+    def get_idle_connections(self):
+        get_idle_size = getattr(self.pool, 'get_idle_size', None)
+        return get_idle_size() if get_idle_size is not None else None
+
+    @property
+    def connections_in_use(self):
+        # released proxies can not be inspected, the pools know what is in use
+        pools = [self.pool] + [replica.pool for replica in self.replicas]
+        return sum(
+            pool.get_size() - pool.get_idle_size()
+            for pool in pools if pool is not None
+        )
+
+    def track_connection(self, connection):
+        pass
+
+    def untrack_connection(self, connection):
+        pass
 
     async def get_connection(self):
-        return await self.pool.acquire()
+        return await self.acquire_from(self.pool)
 
-    async def call_connection_coroutine(
-            self, coroutine_name, sql_query, *args, connection=None,
-            timeout=None, close_connection=True):
-        conn = connection or await self.get_connection()
-        conn_coroutine = getattr(conn, coroutine_name)
+    async def acquire_from(self, pool):
+        return await self.observe_connection(
+            pool.acquire(timeout=self.acquire_timeout)
+        )
+
+    def acquire(
+            self, connection=None, close_connection=True, transaction=False):
+        if transaction:
+            self.last_write_at = time.monotonic()
+        return super().acquire(connection, close_connection, transaction)
+
+    def is_read_query(self, coroutine_name, sql_query):
+        return (
+            coroutine_name != 'execute' and
+            READ_QUERY.match(sql_query) is not None and
+            LOCKING_CLAUSE.search(sql_query) is None
+        )
+
+    async def get_query_connection(self, coroutine_name, sql_query):
+        if not self.replicas:
+            return await self.get_connection()
+        if not self.is_read_query(coroutine_name, sql_query):
+            self.last_write_at = time.monotonic()
+            return await self.get_connection()
+        replica = await self.choose_replica()
+        if replica is None:
+            return await self.get_connection()
+        connection = await self.acquire_from(replica.pool)
+        self.replica_connections[connection] = replica.pool
+        return connection
+
+    async def choose_replica(self):
+        now = time.monotonic()
+        if (self.last_write_at is not None and
+                now - self.last_write_at < self.read_your_writes):
+            return None
+        if self.max_replica_lag is not None and (
+                self.replicas_checked_at is None or
+                now - self.replicas_checked_at >= self.replica_check_interval):
+            self.schedule_replicas_check()
+        replicas = [
+            replica for replica in self.replicas
+            if self.max_replica_lag is None or (
+                replica.lag is not None and replica.lag <= self.max_replica_lag
+            )
+        ]
+        total = sum(replica.weight for replica in replicas)
+        if not total:
+            return None
+        point = random.uniform(0, total)
+        for replica in replicas:
+            point -= replica.weight
+            if point <= 0:
+                return replica
+        return replicas[-1]
+
+    def schedule_replicas_check(self):
+        # reads keep the last known lags while the check runs
+        task = self.replicas_check_task
+        if task is None or task.done():
+            self.replicas_checked_at = time.monotonic()
+            self.replicas_check_task = asyncio.ensure_future(
+                self.check_replicas()
+            )
+
+    async def check_replicas(self):
+        self.replicas_checked_at = time.monotonic()
+        await asyncio.gather(*[
+            self.check_replica(replica) for replica in self.replicas
+        ])
+
+    async def check_replica(self, replica):
+        try:
+            replica.lag = float(await asyncio.wait_for(
+                replica.pool.fetchval(REPLICA_LAG_QUERY),
+                self.replica_check_timeout
+            ))
+        except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError,
+                asyncio.TimeoutError):
+            replica.lag = None
+
+    async def release_connection(self, connection):
+        pool = self.replica_connections.pop(connection, self.pool)
         try:
-            return await conn_coroutine(sql_query, *args, timeout=timeout)
+            await pool.release(connection)
         finally:
-            if close_connection:
-                await self.pool.release(conn)
+            self.observe_release(connection)
+        await self.run_after_transaction(connection)
+
+    async def gather(self, *queries, concurrency=None, timeout=None):
+        concurrency = concurrency or self.kwargs.get('max_size', 10)
+        semaphore = asyncio.Semaphore(concurrency)
+        awaitables = []
+        for query in queries:
+            if isinstance(query, str):
+                query = self.query(query)
+            elif isinstance(query, tuple):
+                query = self.query(*query)
+            awaitables.append(query)
+
+        async def run(awaitable):
+            async with semaphore:
+                return await awaitable
+
+        tasks = [
+            asyncio.ensure_future(run(awaitable)) for awaitable in awaitables
+        ]
+        try:
+            return await asyncio.wait_for(asyncio.gather(*tasks), timeout)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for awaitable in awaitables:
+                if asyncio.iscoroutine(awaitable):
+                    awaitable.close()
+            raise
@@ -0,0 +1,144 @@
+from .builders import Condition, Where
+
+
+def parse_filter(filter_name):
+    if '__' in filter_name:
+        field, lookup = filter_name.rsplit('__', 1)
+        return field, lookup
+    return filter_name, 'exact'
+
+
+class Q:
+    def __init__(self, *children, **lookups):
+        self.children = list(children) + sorted(lookups.items())
+        self.connector = 'AND'
+        self.negated = False
+
+    @classmethod
+    def from_dict(cls, filters, connector='AND'):
+        q = cls()
+        q.children = list(filters.items())
+        q.connector = connector
+        return q
+
+    def __bool__(self):
+        return any(self.children)
+
+    def __repr__(self):
+        return '<Q: {}{} {!r}>'.format(
+            'NOT ' if self.negated else '', self.connector, self.children
+        )
+
+    def combine(self, other, connector):
+        if not isinstance(other, Q):
+            raise TypeError('Cannot combine Q with {!r}'.format(other))
+        q = Q(*[child for child in (self, other) if child])
+        q.connector = connector
+        return q
+
+    def __and__(self, other):
+        return self.combine(other, 'AND')
+
+    def __or__(self, other):
+        return self.combine(other, 'OR')
+
+    def __invert__(self):
+        q = Q(self)
+        q.negated = True
+        return q
+
+    def get_shape(
+            self, in_threshold=None, column_types=None, table_name=None):
+        return (self.connector, self.negated, tuple(
+            child.get_shape(in_threshold, column_types, table_name)
+            if isinstance(child, Q)
+            else self.get_lookup_shape(
+                child[0], child[1], in_threshold, column_types, table_name
+            )
+            for child in self.children
+        ))
+
+    def get_lookup_shape(
+            self, filter_name, value, in_threshold=None, column_types=None,
+            table_name=None):
+        lookup = parse_filter(filter_name)[1]
+        if lookup == 'isnull':
+            return filter_name, bool(value)
+        if self.get_set_cast(
+                filter_name, value, in_threshold, column_types, table_name):
+            return filter_name, 'set'
+        return filter_name
+
+    def get_set_cast(
+            self, filter_name, value, in_threshold=None, column_types=None,
+            table_name=None):
+        if in_threshold is None or not column_types:
+            return None
+        field, lookup = parse_filter(filter_name)
+        if lookup != 'in' or len(value) <= in_threshold:
+            return None
+        # column_types only describes table_name, joined columns keep any()
+        table, _, column = field.rpartition('.')
+        if table and table != table_name:
+            return None
+        column_type = column_types.get(column)
+        return column_type + '[]' if column_type else None
+
+    def has_set_lookups(self, in_threshold):
+        if in_threshold is None:
+            return False
+        for child in self.children:
+            if isinstance(child, Q):
+                if child.has_set_lookups(in_threshold):
+                    return True
+                continue
+            filter_name, value = child
+            if (parse_filter(filter_name)[1] == 'in' and
+                    len(value) > in_threshold):
+                return True
+        return False
+
+    def get_values(self, values=None):
+        values = [] if values is None else values
+        for child in self.children:
+            if isinstance(child, Q):
+                child.get_values(values)
+                continue
+            filter_name, value = child
+            lookup = parse_filter(filter_name)[1]
+            if lookup == 'isnull':
+                continue
+            if lookup == 'between':
+                value = tuple(value)
+                if len(value) != 2:
+                    raise ValueError(
+                        'between lookup expects two values, '
+                        'got {!r}'.format(value)
+                    )
+                values.extend(value)
+            else:
+                values.append(value)
+        return values
+
+    def build_where(
+            self, in_threshold=None, column_types=None, table_name=None):
+        conditions = []
+        for child in self.children:
+            if isinstance(child, Q):
+                if not child:
+                    continue
+                conditions.append(
+                    child.build_where(in_threshold, column_types, table_name)
+                )
+                continue
+            filter_name, value = child
+            field, lookup = parse_filter(filter_name)
+            if lookup == 'isnull' and not value:
+                lookup = 'notnull'
+            cast = self.get_set_cast(
+                filter_name, value, in_threshold, column_types, table_name
+            )
+            if cast:
+                lookup = 'in_set'
+            conditions.append(Condition(field, lookup, cast))
+        return Where(conditions, self.connector, self.negated)
@@ -0,0 +1,67 @@
+import asyncio
+
+
+class DetailLoader:
+    def __init__(
+            self, table_manager, pk_field=None, fields=None, cache=True,
+            max_batch_size=None, **kwargs):
+        self.table_manager = table_manager
+        self.pk_field = pk_field or table_manager.pk_field
+        self.fields = fields
+        if fields and self.pk_field not in fields:
+            self.fields = list(fields) + [self.pk_field]
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.kwargs = kwargs
+        self.futures = {}
+        self.pending = {}
+        self.dispatch_handle = None
+        self.batches = 0
+
+    async def load(self, pk):
+        future = self.futures.get(pk) or self.pending.get(pk)
+        if future is None:
+            loop = asyncio.get_event_loop()
+            future = self.pending[pk] = loop.create_future()
+            if self.cache:
+                self.futures[pk] = future
+            if self.dispatch_handle is None:
+                self.dispatch_handle = loop.call_soon(self.schedule_dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, pks):
+        return await asyncio.gather(*[self.load(pk) for pk in pks])
+
+    def clear(self, pk=None):
+        if pk is None:
+            self.futures.clear()
+        else:
+            self.futures.pop(pk, None)
+
+    def schedule_dispatch(self):
+        pending, self.pending = self.pending, {}
+        self.dispatch_handle = None
+        pks = list(pending)
+        batch_size = self.max_batch_size or len(pks)
+        for start in range(0, len(pks), batch_size):
+            batch = {pk: pending[pk] for pk in pks[start:start + batch_size]}
+            asyncio.ensure_future(self.dispatch(batch))
+
+    async def dispatch(self, batch):
+        self.batches += 1
+        try:
+            rows = await self.table_manager.list(
+                fields=self.fields,
+                filters={'{}__in'.format(self.pk_field): list(batch)},
+                **self.kwargs
+            )
+        except Exception as exc:
+            for pk, future in batch.items():
+                self.futures.pop(pk, None)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        rows_by_pk = {row[self.pk_field]: row for row in rows}
+        for pk, future in batch.items():
+            if not future.done():
+                future.set_result(rows_by_pk.get(pk))
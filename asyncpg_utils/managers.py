@@ -1,9 +1,36 @@
-from .templates import (
-    sql_create_template,
-    sql_delete_template,
-    sql_detail_template,
-    sql_list_template,
-    sql_update_template,
+import asyncio
+import collections
+import functools
+import logging
+import uuid
+
+from .builders import (
+    BulkUpdate,
+    Condition,
+    Delete,
+    Insert,
+    Join,
+    Keyset,
+    Parameter,
+    Select,
+    Update,
+    Upsert,
+    Where,
+)
+from .caches import LRUCache
+from .databases import chunks
+from .filters import Q, parse_filter
+from .pagination import decode_token, encode_token
+from .results import map_record, map_records, to_columns
+
+logger = logging.getLogger(__name__)
+
+HOOK_EVENTS = (
+    'pre_create', 'post_create', 'pre_bulk_create', 'post_bulk_create',
+    'pre_bulk_update', 'post_bulk_update', 'pre_upsert', 'post_upsert',
+    'pre_list', 'post_list', 'pre_detail', 'post_detail', 'pre_update',
+    'post_update', 'pre_delete', 'post_delete', 'pre_update_many',
+    'post_update_many', 'pre_delete_many', 'post_delete_many',
 )
 
 
@@ -17,99 +44,597 @@ class AbstractHook:
             return
         return await event_coroutine(*args, **kwargs)
 
+    def get_event_handler(self, event_name):
+        if type(self).trigger_event is not AbstractHook.trigger_event:
+            return functools.partial(self.trigger_event, event_name)
+        return getattr(self, event_name, None)
+
 
 class TableManager:
-    def __init__(self, database, table_name, pk_field='id', hooks=None):
+    def __init__(
+            self, database, table_name, pk_field='id', hooks=None,
+            sql_cache_size=128, cache=None, concurrent_hooks=False,
+            background_hooks=False, hooks_backlog=1000, in_threshold=1000):
         self.database = database
         self.table_name = table_name
         self.pk_field = pk_field
         self.hooks = [hook(self) for hook in hooks or []]
+        self.hook_handlers = {}
+        for event_name in HOOK_EVENTS:
+            self.get_hook_handlers(event_name)
+        self.concurrent_hooks = concurrent_hooks
+        self.background_hooks = background_hooks
+        self.hooks_backlog = hooks_backlog
+        self.hooks_queue = collections.deque()
+        self.hooks_worker = None
+        self.sql_cache = LRUCache(sql_cache_size, self.release_sql_query)
+        self.registered_sql_keys = set()
+        self.column_types = None
+        self.cache = cache
+        self.invalidation_channel = None
+        self.in_threshold = in_threshold
+
+    def parse_filter(self, filter_name):
+        return parse_filter(filter_name)
 
     def parse_filters(self, filters):
+        # Legacy helper kept for backwards compatibility, list and the other
+        # queries build their filters with Q. The result has a single lookup
+        # per field, so id__gt and id__lt collapse into the last one given.
         result = {}
 
-        for field, value in filters.items():
-            lookup = 'exact'
-            if '__' in field:
-                field, lookup = field.split('__')
+        for filter_name, value in filters.items():
+            field, lookup = self.parse_filter(filter_name)
             result[field] = {'lookup': lookup, 'value': value}
 
         return result
 
+    def parse_joins(self, joins):
+        return tuple(
+            (join_table, value['type'], value['source'], value['target'])
+            for join_table, value in joins.items()
+        )
+
+    def build_joins(self, joins):
+        return [
+            Join(join_table, value['source'], value['target'], value['type'])
+            for join_table, value in joins.items()
+        ]
+
+    def cache_sql_query(self, key, sql_query):
+        statement_registry = self.database.statement_registry
+        if statement_registry is not None and self.sql_cache.maxsize:
+            statement_registry.register(sql_query)
+            self.registered_sql_keys.add(key)
+        return self.sql_cache.set(key, sql_query)
+
+    def release_sql_query(self, key, sql_query):
+        if key in self.registered_sql_keys:
+            self.registered_sql_keys.discard(key)
+            self.database.statement_registry.unregister(sql_query)
+
+    async def get_column_types(self, **kwargs):
+        if self.column_types is None:
+            rows = await self.database.query(
+                'SELECT attname, format_type(atttypid, atttypmod) AS type '
+                'FROM pg_attribute '
+                'WHERE attrelid = $1::regclass AND attnum > 0 '
+                'AND NOT attisdropped',
+                self.table_name, **kwargs
+            )
+            self.column_types = {row['attname']: row['type'] for row in rows}
+        return self.column_types
+
+    def get_filters(self, filters, filters_operator='AND'):
+        if isinstance(filters, Q):
+            return filters
+        return Q.from_dict(filters or {}, filters_operator)
+
+    async def load_column_types(self, kwargs):
+        # the caller's connection is still needed for the query itself
+        connection = kwargs.get('connection')
+        return await self.get_column_types(
+            connection=connection, close_connection=connection is None
+        )
+
+    async def load_set_column_types(self, filters, kwargs):
+        if self.column_types is None and filters.has_set_lookups(
+                self.in_threshold):
+            await self.load_column_types(kwargs)
+
+    def get_cache_key(self, kind, *parts):
+        return '{}:{}:{}'.format(
+            self.table_name, kind, ':'.join(repr(part) for part in parts)
+        )
+
+    async def get_cache_generation(self, kind):
+        key = self.get_cache_key('generation', kind)
+        generation = await self.cache.get(key)
+        if generation is None:
+            generation = await self.bump_cache_generation(kind)
+        return generation
+
+    async def bump_cache_generation(self, kind):
+        generation = uuid.uuid4().hex
+        await self.cache.set(
+            self.get_cache_key('generation', kind), generation, ttl=0
+        )
+        return generation
+
+    def get_detail_cache_key(self, pk, generation):
+        return self.get_cache_key('detail', generation, pk)
+
+    def get_open_connection(self, kwargs):
+        if kwargs.get('close_connection', True):
+            return None
+        return kwargs.get('connection')
+
+    async def invalidate_cache(self, pks=None, connection=None):
+        await self.evict_cache(pks)
+        if self.cache is not None and connection is not None:
+            # reads before the commit may cache the old rows again
+            self.database.call_after_transaction(
+                connection, functools.partial(self.evict_cache, pks)
+            )
+        if self.invalidation_channel is not None:
+            await self.invalidation_channel.publish(
+                self.table_name, pks, connection=connection
+            )
+
+    async def evict_cache(self, pks=None):
+        if self.cache is None:
+            return
+        await self.bump_cache_generation('list')
+        if pks is None:
+            await self.bump_cache_generation('detail')
+        elif pks:
+            generation = await self.get_cache_generation('detail')
+            await self.cache.delete(*[
+                self.get_detail_cache_key(pk, generation) for pk in pks
+            ])
+
+    def get_hook_handlers(self, event_name):
+        handlers = self.hook_handlers.get(event_name)
+        if handlers is None:
+            handlers = self.hook_handlers[event_name] = tuple(
+                handler for handler in (
+                    hook.get_event_handler(event_name) for hook in self.hooks
+                ) if handler is not None
+            )
+        return handlers
+
     async def trigger_hooks(self, event_name, *args, **kwargs):
-        for hook in self.hooks:
-            await hook.trigger_event(event_name, *args, **kwargs)
+        handlers = self.get_hook_handlers(event_name)
+        if not handlers:
+            return
+        if self.background_hooks and event_name.startswith('post_'):
+            if self.enqueue_hooks(handlers, args, kwargs):
+                return
+        await self.run_hooks(handlers, args, kwargs)
+
+    async def run_hooks(self, handlers, args, kwargs):
+        if self.concurrent_hooks and len(handlers) > 1:
+            await asyncio.gather(*[
+                handler(*args, **kwargs) for handler in handlers
+            ])
+            return
+        for handler in handlers:
+            await handler(*args, **kwargs)
+
+    def enqueue_hooks(self, handlers, args, kwargs):
+        if len(self.hooks_queue) >= self.hooks_backlog:
+            return False
+        self.hooks_queue.append((handlers, args, kwargs))
+        if self.hooks_worker is None or self.hooks_worker.done():
+            self.hooks_worker = asyncio.ensure_future(self.process_hooks())
+        return True
+
+    async def process_hooks(self):
+        while self.hooks_queue:
+            handlers, args, kwargs = self.hooks_queue.popleft()
+            try:
+                await self.run_hooks(handlers, args, kwargs)
+            except Exception:
+                logger.exception(
+                    'background hooks failed on %s', self.table_name
+                )
+        self.hooks_worker = None
+
+    async def wait_hooks(self):
+        if self.hooks_worker is not None:
+            await asyncio.shield(self.hooks_worker)
 
     async def create(self, data, **kwargs):
         field_names = [field_name for field_name in data.keys()]
         field_values = [field_value for _, field_value in data.items()]
-        sql_query = sql_create_template.render({
-            'table_name': self.table_name,
-            'field_names': field_names
-        })
+        key = ('create', tuple(field_names))
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(
+                key, Insert(self.table_name, field_names).build()
+            )
         await self.trigger_hooks('pre_create', data)
         row = await self.database.query_one(sql_query, *field_values, **kwargs)
+        await self.invalidate_cache((), self.get_open_connection(kwargs))
         await self.trigger_hooks('post_create', row)
         return row
 
-    async def list(
+    async def bulk_create(
+            self, rows, returning=False, batch_size=10000, connection=None,
+            timeout=None, close_connection=True):
+        result = [] if returning else 0
+        async with self.database.acquire(
+                connection, close_connection, transaction=True) as conn:
+            for batch in chunks(rows, batch_size):
+                await self.trigger_hooks('pre_bulk_create', batch)
+                batch_result = await self.database.bulk_insert(
+                    self.table_name, batch, returning=returning,
+                    batch_size=batch_size, connection=conn, timeout=timeout,
+                    close_connection=False
+                )
+                await self.invalidate_cache((), conn)
+                await self.trigger_hooks('post_bulk_create', batch_result)
+                result += batch_result
+        return result
+
+    async def bulk_write(
+            self, event_name, rows, build_sql_query, returning=False,
+            batch_size=10000, connection=None, timeout=None,
+            close_connection=True):
+        result = [] if returning else 0
+        async with self.database.acquire(
+                connection, close_connection, transaction=True) as conn:
+            column_types = await self.get_column_types(
+                connection=conn, close_connection=False
+            )
+            for batch in chunks(rows, batch_size):
+                field_names = list(batch[0].keys())
+                for row in batch:
+                    if row.keys() != set(field_names):
+                        raise ValueError(
+                            'Rows must have the same keys, expected {!r} '
+                            'got {!r}'.format(field_names, list(row.keys()))
+                        )
+                sql_query = build_sql_query(field_names, column_types)
+                values = [
+                    [row[field_name] for row in batch]
+                    for field_name in field_names
+                ]
+                await self.trigger_hooks('pre_' + event_name, batch)
+                if returning:
+                    batch_result = await self.database.query(
+                        sql_query, *values, connection=conn, timeout=timeout,
+                        close_connection=False
+                    )
+                else:
+                    status = await self.database.execute(
+                        sql_query, *values, connection=conn, timeout=timeout,
+                        close_connection=False
+                    )
+                    batch_result = int(status.split()[-1])
+                if self.pk_field in field_names:
+                    await self.invalidate_cache(
+                        [row[self.pk_field] for row in batch], conn
+                    )
+                else:
+                    await self.invalidate_cache(None, conn)
+                await self.trigger_hooks('post_' + event_name, batch_result)
+                result += batch_result
+        return result
+
+    async def bulk_update(
+            self, rows, key=None, returning=False, batch_size=10000,
+            **kwargs):
+        key = key or self.pk_field
+
+        def build_sql_query(field_names, column_types):
+            cache_key = ('bulk_update', key, tuple(field_names), returning)
+            sql_query = self.sql_cache.get(cache_key)
+            if sql_query is None:
+                sql_query = self.cache_sql_query(cache_key, BulkUpdate(
+                    self.table_name,
+                    key,
+                    field_names,
+                    [column_types[field_name] for field_name in field_names],
+                    returning='*' if returning else None
+                ).build())
+            return sql_query
+
+        return await self.bulk_write(
+            'bulk_update', rows, build_sql_query, returning=returning,
+            batch_size=batch_size, **kwargs
+        )
+
+    async def upsert(
+            self, rows, conflict_target=None, update_fields=None,
+            returning=False, batch_size=10000, **kwargs):
+        conflict_target = conflict_target or self.pk_field
+        if isinstance(conflict_target, str):
+            conflict_target = (conflict_target,)
+        conflict_target = tuple(conflict_target)
+
+        def build_sql_query(field_names, column_types):
+            fields = update_fields
+            if fields is None:
+                fields = [
+                    field_name for field_name in field_names
+                    if field_name not in conflict_target
+                ]
+            cache_key = (
+                'upsert', tuple(field_names), conflict_target, tuple(fields),
+                returning
+            )
+            sql_query = self.sql_cache.get(cache_key)
+            if sql_query is None:
+                sql_query = self.cache_sql_query(cache_key, Upsert(
+                    self.table_name,
+                    field_names,
+                    [column_types[field_name] for field_name in field_names],
+                    conflict_target,
+                    update_fields=fields,
+                    returning='*' if returning else None
+                ).build())
+            return sql_query
+
+        return await self.bulk_write(
+            'upsert', rows, build_sql_query, returning=returning,
+            batch_size=batch_size, **kwargs
+        )
+
+    def get_keyset_fields(self, order_by=None):
+        if order_by is None:
+            order_by = []
+        elif isinstance(order_by, str):
+            order_by = [order_by]
+        order_by = list(order_by)
+        if self.pk_field not in order_by:
+            order_by.append(self.pk_field)
+        return order_by
+
+    def get_list_query(
             self, fields=None, filters=None, filters_operator='AND',
             joins=None, order_by=None, order_by_sort='ASC', count=False,
-            limit=None, offset=None, **kwargs):
-        filters = filters or {}
-        filter_values = [filter_value for _, filter_value in filters.items()]
+            limit=None, offset=None, after=None):
+        filters = self.get_filters(filters, filters_operator)
+        filter_values = filters.get_values()
         joins = joins or {}
-        sql_query = sql_list_template.render({
-            'table_name': self.table_name,
-            'fields': fields,
-            'filters': self.parse_filters(filters),
-            'filters_operator': filters_operator,
-            'joins': joins,
-            'order_by': order_by,
-            'order_by_sort': order_by_sort,
-            'count': count,
-            'limit': limit,
-            'offset': offset
-        })
+        if after is not None:
+            order_by = self.get_keyset_fields(order_by)
+            filter_values.extend(after)
+        if order_by is not None and not isinstance(order_by, str):
+            order_by = tuple(order_by)
+        limit, offset = limit or None, offset or None
+        filter_values.extend(
+            value for value in (limit, offset) if value is not None
+        )
+        key = (
+            'list', tuple(fields or ()),
+            filters.get_shape(
+                self.in_threshold, self.column_types, self.table_name
+            ),
+            self.parse_joins(joins), order_by, order_by_sort, count,
+            limit is not None, offset is not None, after is not None
+        )
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            where = filters.build_where(
+                self.in_threshold, self.column_types, self.table_name
+            )
+            if after is not None:
+                keyset = Keyset(order_by, order_by_sort)
+                where = Where([where, keyset] if where else [keyset])
+            sql_query = self.cache_sql_query(key, Select(
+                self.table_name,
+                fields=fields,
+                count=count,
+                joins=self.build_joins(joins),
+                where=where,
+                order_by=order_by,
+                order_by_sort=order_by_sort,
+                limit=Parameter() if limit is not None else None,
+                offset=Parameter() if offset is not None else None
+            ).build())
+        return sql_query, filter_values
+
+    async def list(
+            self, fields=None, filters=None, filters_operator='AND',
+            joins=None, order_by=None, order_by_sort='ASC', count=False,
+            limit=None, offset=None, after=None, as_columns=False,
+            result_type=None, **kwargs):
+        rows = await self.list_rows(
+            fields, filters, filters_operator, joins, order_by, order_by_sort,
+            count, limit, offset, after, **kwargs
+        )
+        if as_columns:
+            return to_columns(rows, fields, use_numpy=as_columns == 'numpy')
+        return map_records(rows, result_type)
+
+    async def list_rows(
+            self, fields, filters, filters_operator, joins, order_by,
+            order_by_sort, count, limit, offset, after, **kwargs):
+        query_filters = self.get_filters(filters, filters_operator)
+        await self.load_set_column_types(query_filters, kwargs)
+        sql_query, filter_values = self.get_list_query(
+            fields, query_filters, filters_operator, joins, order_by,
+            order_by_sort, count, limit, offset, after
+        )
         await self.trigger_hooks(
-            'pre_list', fields, filters, order_by, order_by_sort, count, limit,
-            offset
+            'pre_list', fields, filters or {}, order_by, order_by_sort, count,
+            limit, offset
         )
+        cache_key = None
+        if (self.cache is not None and not joins and
+                not kwargs.get('connection')):
+            cache_key = self.get_cache_key(
+                'list', await self.get_cache_generation('list'), sql_query,
+                filter_values
+            )
+            rows = await self.cache.get(cache_key)
+            if rows is not None:
+                rows = list(rows)
+                await self.trigger_hooks('post_list', rows)
+                return rows
         rows = await self.database.query(sql_query, *filter_values, **kwargs)
+        if cache_key is not None:
+            await self.cache.set(cache_key, tuple(rows))
         await self.trigger_hooks('post_list', rows)
         return rows
 
-    async def detail(self, pk, pk_field=None, fields=None, **kwargs):
+    async def paginate(
+            self, limit, fields=None, filters=None, filters_operator='AND',
+            joins=None, order_by=None, order_by_sort='ASC', token=None,
+            result_type=None, **kwargs):
+        order_by = self.get_keyset_fields(order_by)
+        if fields:
+            # the next token is read from the keyset columns
+            fields = list(fields) + [
+                field for field in order_by
+                if field not in fields and
+                field.rsplit('.', 1)[-1] not in fields
+            ]
+        rows = await self.list_rows(
+            fields, filters, filters_operator, joins, order_by, order_by_sort,
+            False, limit + 1, None,
+            decode_token(token) if token is not None else None, **kwargs
+        )
+        next_token = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_row = rows[-1]
+            next_token = encode_token(
+                last_row[field.rsplit('.', 1)[-1]] for field in order_by
+            )
+        return map_records(rows, result_type), next_token
+
+    def iterate(
+            self, fields=None, filters=None, filters_operator='AND',
+            joins=None, order_by=None, order_by_sort='ASC', limit=None,
+            offset=None, prefetch=None, **kwargs):
+        sql_query, filter_values = self.get_list_query(
+            fields, filters, filters_operator, joins, order_by, order_by_sort,
+            False, limit, offset
+        )
+        return self.database.stream(
+            sql_query, *filter_values, prefetch=prefetch, **kwargs
+        )
+
+    async def export(
+            self, output, fields=None, filters=None, filters_operator='AND',
+            joins=None, order_by=None, order_by_sort='ASC', limit=None,
+            offset=None, format='csv', **kwargs):
+        filters = self.get_filters(filters, filters_operator)
+        await self.load_set_column_types(filters, kwargs)
+        sql_query, filter_values = self.get_list_query(
+            fields, filters, filters_operator, joins, order_by, order_by_sort,
+            False, limit, offset
+        )
+        return await self.database.export(
+            sql_query, *filter_values, output=output, format=format, **kwargs
+        )
+
+    async def detail(
+            self, pk, pk_field=None, fields=None, result_type=None, **kwargs):
         pk_field = pk_field or self.pk_field
-        sql_query = sql_detail_template.render({
-            'table_name': self.table_name,
-            'fields': fields,
-            'pk_field': pk_field
-        })
+        key = ('detail', pk_field, tuple(fields or ()))
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(key, Select(
+                self.table_name, fields=fields,
+                where=Where([Condition(pk_field)])
+            ).build())
         await self.trigger_hooks('pre_detail', pk, pk_field, fields)
+        cache_key = None
+        if (self.cache is not None and pk_field == self.pk_field and
+                not fields and not kwargs.get('connection')):
+            cache_key = self.get_detail_cache_key(
+                pk, await self.get_cache_generation('detail')
+            )
+            row = await self.cache.get(cache_key)
+            if row is not None:
+                await self.trigger_hooks('post_detail', row)
+                return map_record(row, result_type)
         row = await self.database.query_one(sql_query, pk, **kwargs)
+        if cache_key is not None and row is not None:
+            await self.cache.set(cache_key, row)
         await self.trigger_hooks('post_detail', row)
-        return row
+        return map_record(row, result_type)
 
     async def update(self, pk, data, **kwargs):
         field_names = [field_name for field_name in data.keys()]
         field_values = [field_value for _, field_value in data.items()]
-        sql_query = sql_update_template.render({
-            'table_name': self.table_name,
-            'field_names': field_names,
-            'pk_field': self.pk_field
-        })
+        key = ('update', self.pk_field, tuple(field_names))
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(key, Update(
+                self.table_name, field_names, Where([Condition(self.pk_field)])
+            ).build())
         await self.trigger_hooks('pre_update', pk, data)
         row = await self.database.query_one(sql_query, *field_values, pk, **kwargs)
+        await self.invalidate_cache((pk,), self.get_open_connection(kwargs))
         await self.trigger_hooks('post_update', row)
         return row
 
     async def delete(self, pk, **kwargs):
-        sql_query = sql_delete_template.render({
-            'table_name': self.table_name,
-            'pk_field': self.pk_field
-        })
+        key = ('delete', self.pk_field)
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(key, Delete(
+                self.table_name, Where([Condition(self.pk_field)])
+            ).build())
         await self.trigger_hooks('pre_delete', pk)
         await self.database.query_one(sql_query, pk, **kwargs)
+        await self.invalidate_cache((pk,), self.get_open_connection(kwargs))
         await self.trigger_hooks('post_delete', pk)
         return True
+
+    async def get_pks_condition(self, pks, kwargs):
+        if self.in_threshold is not None and len(pks) > self.in_threshold:
+            column_types = await self.load_column_types(kwargs)
+            return Condition(
+                self.pk_field, 'in_set', column_types[self.pk_field] + '[]'
+            )
+        return Condition(self.pk_field, 'in')
+
+    async def delete_many(self, pks, **kwargs):
+        pks = list(pks)
+        condition = await self.get_pks_condition(pks, kwargs)
+        key = ('delete_many', self.pk_field, condition.lookup)
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(key, Delete(
+                self.table_name, Where([condition])
+            ).build())
+        await self.trigger_hooks('pre_delete_many', pks)
+        status = await self.database.execute(sql_query, pks, **kwargs)
+        await self.invalidate_cache(pks, self.get_open_connection(kwargs))
+        await self.trigger_hooks('post_delete_many', pks)
+        return int(status.split()[-1])
+
+    async def update_many(self, pks, data, returning=False, **kwargs):
+        pks = list(pks)
+        field_names = [field_name for field_name in data.keys()]
+        field_values = [field_value for _, field_value in data.items()]
+        condition = await self.get_pks_condition(pks, kwargs)
+        key = (
+            'update_many', self.pk_field, tuple(field_names), condition.lookup,
+            returning
+        )
+        sql_query = self.sql_cache.get(key)
+        if sql_query is None:
+            sql_query = self.cache_sql_query(key, Update(
+                self.table_name, field_names, Where([condition]),
+                returning='*' if returning else None
+            ).build())
+        await self.trigger_hooks('pre_update_many', pks, data)
+        if returning:
+            result = await self.database.query(
+                sql_query, *field_values, pks, **kwargs
+            )
+        else:
+            status = await self.database.execute(
+                sql_query, *field_values, pks, **kwargs
+            )
+            result = int(status.split()[-1])
+        await self.invalidate_cache(pks, self.get_open_connection(kwargs))
+        await self.trigger_hooks('post_update_many', result)
+        return result
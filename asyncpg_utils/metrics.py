@@ -0,0 +1,89 @@
+import bisect
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5, 5.0, 10.0,
+)
+
+
+class AbstractMetricsCollector:
+    enabled = True
+
+    def observe_acquire(self, duration):
+        """Time spent waiting for a connection."""
+
+    def observe_query(self, sql_query, duration):
+        """Time spent executing a statement on a connection."""
+
+    def increment_timeout(self, kind):
+        """A timeout while acquiring a connection or executing a query."""
+
+    def set_connections(self, in_use, idle=None):
+        """Current number of connections in use and idle."""
+
+
+class NullMetricsCollector(AbstractMetricsCollector):
+    enabled = False
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def info(self):
+        return {
+            'buckets': dict(zip(self.buckets + (float('inf'),), self.counts)),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class MemoryMetricsCollector(AbstractMetricsCollector):
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_statements=1000):
+        self.buckets = buckets
+        self.max_statements = max_statements
+        self.acquire_time = Histogram(buckets)
+        self.query_time = {}
+        self.timeouts = {}
+        self.connections_in_use = 0
+        self.connections_idle = None
+
+    def observe_acquire(self, duration):
+        self.acquire_time.observe(duration)
+
+    def observe_query(self, sql_query, duration):
+        histogram = self.query_time.get(sql_query)
+        if histogram is None:
+            if len(self.query_time) >= self.max_statements:
+                sql_query = '<other>'
+            histogram = self.query_time.setdefault(
+                sql_query, Histogram(self.buckets)
+            )
+        histogram.observe(duration)
+
+    def increment_timeout(self, kind):
+        self.timeouts[kind] = self.timeouts.get(kind, 0) + 1
+
+    def set_connections(self, in_use, idle=None):
+        self.connections_in_use = in_use
+        self.connections_idle = idle
+
+    def info(self):
+        return {
+            'acquire_time': self.acquire_time.info(),
+            'query_time': {
+                sql_query: histogram.info()
+                for sql_query, histogram in self.query_time.items()
+            },
+            'timeouts': dict(self.timeouts),
+            'connections_in_use': self.connections_in_use,
+            'connections_idle': self.connections_idle,
+        }
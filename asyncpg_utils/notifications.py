@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import uuid
+
+import asyncpg
+
+from .pagination import decode_value, encode_value
+
+MAX_PAYLOAD_SIZE = 7999
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationChannel:
+    def __init__(
+            self, database, channel='asyncpg_utils_invalidation',
+            coalesce_delay=0.05, reconnect_delay=1):
+        self.database = database
+        self.channel = channel
+        self.coalesce_delay = coalesce_delay
+        self.reconnect_delay = reconnect_delay
+        self.origin = uuid.uuid4().hex
+        self.managers = {}
+        self.connection = None
+        self.pending = {}
+        self.flush_handle = None
+        self.reconnect_task = None
+        self.published = 0
+        self.received = 0
+        self.flushes = 0
+        self.reconnects = 0
+
+    def register(self, table_manager):
+        table_manager.invalidation_channel = self
+        self.managers.setdefault(table_manager.table_name, []).append(
+            table_manager
+        )
+        return table_manager
+
+    def encode_payload(self, table_name, pks):
+        data = {'origin': self.origin, 'table': table_name, 'pks': pks}
+        payload = json.dumps(data, default=encode_value, separators=(',', ':'))
+        if pks and len(payload.encode('utf-8')) > MAX_PAYLOAD_SIZE:
+            return self.encode_payload(table_name, None)
+        return payload
+
+    async def publish(self, table_name, pks=None, connection=None):
+        payload = self.encode_payload(
+            table_name, list(pks) if pks is not None else None
+        )
+        await self.database.execute(
+            'SELECT pg_notify($1, $2)', self.channel, payload,
+            connection=connection, close_connection=connection is None
+        )
+        self.published += 1
+
+    async def listen(self):
+        if self.connection is None:
+            connection = await self.database.get_connection()
+            try:
+                await connection.add_listener(
+                    self.channel, self.on_notification
+                )
+            except BaseException:
+                await self.database.release_connection(connection)
+                raise
+            # add_termination_listener is available since asyncpg 0.21
+            add_termination_listener = getattr(
+                connection, 'add_termination_listener', None
+            )
+            if add_termination_listener is not None:
+                add_termination_listener(self.on_termination)
+            self.connection = connection
+
+    async def close(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            remove_termination_listener = getattr(
+                connection, 'remove_termination_listener', None
+            )
+            if remove_termination_listener is not None:
+                remove_termination_listener(self.on_termination)
+            if not connection.is_closed():
+                await connection.remove_listener(
+                    self.channel, self.on_notification
+                )
+            await self.database.release_connection(connection)
+
+    def on_termination(self, connection):
+        if self.connection is not None and self.reconnect_task is None:
+            self.reconnect_task = asyncio.ensure_future(self.reconnect())
+
+    async def reconnect(self):
+        connection, self.connection = self.connection, None
+        try:
+            await self.database.release_connection(connection)
+        except Exception:
+            logger.exception('failed to release the %s listener', self.channel)
+        while self.connection is None:
+            try:
+                await self.listen()
+            except (asyncpg.PostgresError, asyncpg.InterfaceError, OSError):
+                logger.warning(
+                    'failed to listen on %s, retrying in %s seconds',
+                    self.channel, self.reconnect_delay, exc_info=True
+                )
+                await asyncio.sleep(self.reconnect_delay)
+        # notifications sent while disconnected are lost
+        for table_managers in self.managers.values():
+            for table_manager in table_managers:
+                await table_manager.evict_cache()
+        self.reconnects += 1
+        self.reconnect_task = None
+
+    def on_notification(self, connection, pid, channel, payload):
+        data = json.loads(payload, object_hook=decode_value)
+        if data.get('origin') == self.origin:
+            return
+        self.received += 1
+        table_name, pks = data['table'], data['pks']
+        if pks is None or self.pending.get(table_name, ()) is None:
+            self.pending[table_name] = None
+        else:
+            self.pending.setdefault(table_name, set()).update(pks)
+        if self.flush_handle is None:
+            loop = asyncio.get_event_loop()
+            self.flush_handle = loop.call_later(
+                self.coalesce_delay, self.schedule_flush
+            )
+
+    def schedule_flush(self):
+        self.flush_handle = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        for table_name, pks in pending.items():
+            for table_manager in self.managers.get(table_name, ()):
+                await table_manager.evict_cache(pks)
+        self.flushes += 1
@@ -0,0 +1,50 @@
+import logging
+import random
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+QueryEvent = namedtuple('QueryEvent', (
+    'coroutine_name',
+    'sql_query',
+    'args_count',
+    'row_count',
+    'connection_id',
+    'wait_time',
+    'duration',
+    'error',
+))
+
+
+def get_row_count(coroutine_name, result):
+    if result is None:
+        return 0
+    if coroutine_name == 'fetch':
+        return len(result)
+    if coroutine_name == 'execute':
+        count = result.rsplit(' ', 1)[-1]
+        return int(count) if count.isdigit() else None
+    return 1
+
+
+class SlowQueryLogger:
+    def __init__(
+            self, threshold=0.5, sample_rate=1.0, logger=logger,
+            level=logging.WARNING):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, event):
+        if event.duration < self.threshold:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.logger.log(
+            self.level,
+            'slow query, duration=%.6f, wait_time=%.6f, rows=%s, args=%s, '
+            'connection_id=%s, error=%r, sql_query=%s',
+            event.duration, event.wait_time, event.row_count, event.args_count,
+            event.connection_id, event.error, ' '.join(event.sql_query.split())
+        )
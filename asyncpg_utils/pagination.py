@@ -0,0 +1,71 @@
+import base64
+import datetime
+import decimal
+import json
+import uuid
+
+
+def encode_timezone(value):
+    offset = value.utcoffset()
+    return None if offset is None else int(offset.total_seconds())
+
+
+def decode_timezone(offset):
+    if offset is None:
+        return None
+    return datetime.timezone(datetime.timedelta(seconds=offset))
+
+
+def encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'$type': 'datetime', 'value': [
+            value.year, value.month, value.day, value.hour, value.minute,
+            value.second, value.microsecond, encode_timezone(value)
+        ]}
+    if isinstance(value, datetime.date):
+        return {'$type': 'date', 'value': [value.year, value.month, value.day]}
+    if isinstance(value, datetime.time):
+        return {'$type': 'time', 'value': [
+            value.hour, value.minute, value.second, value.microsecond,
+            encode_timezone(value)
+        ]}
+    if isinstance(value, decimal.Decimal):
+        return {'$type': 'decimal', 'value': str(value)}
+    if isinstance(value, uuid.UUID):
+        return {'$type': 'uuid', 'value': str(value)}
+    raise TypeError('Unsupported token value {!r}'.format(value))
+
+
+def decode_value(value):
+    type_name = value.get('$type')
+    data = value.get('value')
+    if type_name == 'datetime':
+        return datetime.datetime(*data[:7], tzinfo=decode_timezone(data[7]))
+    if type_name == 'date':
+        return datetime.date(*data)
+    if type_name == 'time':
+        return datetime.time(*data[:4], tzinfo=decode_timezone(data[4]))
+    if type_name == 'decimal':
+        return decimal.Decimal(data)
+    if type_name == 'uuid':
+        return uuid.UUID(data)
+    return value
+
+
+def encode_token(values):
+    data = json.dumps(
+        list(values), default=encode_value, separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_token(token):
+    try:
+        data = base64.urlsafe_b64decode(token.encode('ascii'))
+        return tuple(
+            json.loads(data.decode('utf-8'), object_hook=decode_value)
+        )
+    except (TypeError, ValueError) as exc:
+        raise ValueError(
+            'Invalid pagination token {!r}'.format(token)
+        ) from exc
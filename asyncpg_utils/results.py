@@ -0,0 +1,119 @@
+import array
+import keyword
+from collections import namedtuple
+
+from .caches import LRUCache
+
+ARRAY_TYPECODES = {int: 'q', float: 'd'}
+NUMPY_DTYPES = {int: 'int64', float: 'float64', bool: 'bool'}
+RESULT_TYPES = ('record', 'tuple', 'namedtuple', 'slots')
+
+row_classes = LRUCache(256)
+
+
+class SlotsRow:
+    __slots__ = ()
+
+    def __init__(self, values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, SlotsRow):
+            return NotImplemented
+        return (
+            self.__slots__ == other.__slots__ and tuple(self) == tuple(other)
+        )
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name))
+            for name in self.__slots__
+        ))
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError as exc:
+        raise ImportError('numpy is required for numpy columns') from exc
+    return numpy
+
+
+def to_array(values, numpy=None):
+    value_type = type(values[0])
+    try:
+        if numpy is not None:
+            dtype = NUMPY_DTYPES.get(value_type)
+            if dtype is not None and None not in values:
+                return numpy.array(values, dtype=dtype)
+        else:
+            typecode = ARRAY_TYPECODES.get(value_type)
+            if typecode is not None:
+                return array.array(typecode, values)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return list(values)
+
+
+def to_columns(records, fields=None, use_numpy=False):
+    numpy = import_numpy() if use_numpy else None
+    if not records:
+        return {field: [] for field in fields or ()}
+    names = list(records[0].keys())
+    return {
+        name: to_array(values, numpy)
+        for name, values in zip(names, zip(*records))
+    }
+
+
+def get_slots(names):
+    slots = []
+    for index, name in enumerate(names):
+        if (not name.isidentifier() or keyword.iskeyword(name) or
+                name.startswith('__') or name in slots):
+            name = '_{}'.format(index)
+        slots.append(name)
+    return tuple(slots)
+
+
+def get_row_class(result_type, names):
+    key = (result_type, names)
+    row_class = row_classes.get(key)
+    if row_class is None:
+        if result_type == 'namedtuple':
+            row_class = namedtuple('Row', names, rename=True)
+        else:
+            row_class = type(
+                'Row', (SlotsRow,), {'__slots__': get_slots(names)}
+            )
+        row_classes.set(key, row_class)
+    return row_class
+
+
+def map_records(records, result_type=None):
+    if result_type is None or result_type == 'record' or not records:
+        return records
+    if result_type == 'tuple':
+        return [tuple(record) for record in records]
+    if result_type not in RESULT_TYPES:
+        raise ValueError('Invalid result type {!r}'.format(result_type))
+    row_class = get_row_class(result_type, tuple(records[0].keys()))
+    if result_type == 'namedtuple':
+        return [row_class._make(record) for record in records]
+    return [row_class(record) for record in records]
+
+
+def map_record(record, result_type=None):
+    if record is None:
+        return None
+    return map_records([record], result_type)[0]
@@ -0,0 +1,115 @@
+from asyncpg.exceptions import (
+    InvalidCachedStatementError,
+    OutdatedSchemaCacheError,
+)
+from asyncpg.prepared_stmt import PreparedStatement
+
+from .caches import LRUCache
+
+SCHEMA_CHANGE_ERRORS = (InvalidCachedStatementError, OutdatedSchemaCacheError)
+
+
+def unwrap_connection(connection):
+    # Pool connections are proxies recreated on every acquire, prepared
+    # statements belong to the underlying connection.
+    return getattr(connection, '_con', None) or connection
+
+
+def bind_statement(statement, connection, sql_query):
+    # asyncpg invalidates statement objects when a pooled connection is
+    # released, but the server side statement stays valid, so it is bound
+    # again to the current checkout. These attributes are asyncpg internals,
+    # when they are missing or change None tells the caller to prepare the
+    # statement again through the public API on every checkout.
+    try:
+        if statement._con_release_ctr == connection._pool_release_ctr:
+            return statement
+        return PreparedStatement(connection, sql_query, statement._state)
+    except (AttributeError, TypeError):
+        return None
+
+
+class StatementRegistry:
+    def __init__(self, max_statements=256):
+        self.max_statements = max_statements
+        self.statements = {}
+        self.connections = {}
+        self.prepares = 0
+        self.reuses = 0
+        self.invalidations = 0
+
+    def __contains__(self, sql_query):
+        return sql_query in self.statements
+
+    def register(self, sql_query):
+        self.statements[sql_query] = self.statements.get(sql_query, 0) + 1
+        return sql_query
+
+    def unregister(self, sql_query):
+        count = self.statements.pop(sql_query, 0) - 1
+        if count > 0:
+            self.statements[sql_query] = count
+            return
+        for cache in self.connections.values():
+            cache.delete(sql_query)
+
+    def get_connection_cache(self, connection):
+        connection = unwrap_connection(connection)
+        cache = self.connections.get(connection)
+        if cache is None:
+            for closed_connection in [
+                    conn for conn in self.connections if conn.is_closed()]:
+                del self.connections[closed_connection]
+            cache = LRUCache(self.max_statements)
+            self.connections[connection] = cache
+        return cache
+
+    async def prepare(self, connection, sql_query, timeout=None):
+        cache = self.get_connection_cache(connection)
+        statement = cache.get(sql_query)
+        if statement is not None:
+            statement = bind_statement(
+                statement, unwrap_connection(connection), sql_query
+            )
+        if statement is None:
+            statement = await connection.prepare(sql_query, timeout=timeout)
+            self.prepares += 1
+        else:
+            self.reuses += 1
+        return cache.set(sql_query, statement)
+
+    def invalidate(self, connection, sql_query):
+        self.get_connection_cache(connection).delete(sql_query)
+        self.invalidations += 1
+
+    async def call_statement_coroutine(
+            self, statement, coroutine_name, *args, timeout=None):
+        if coroutine_name == 'execute':
+            await statement.fetch(*args, timeout=timeout)
+            return statement.get_statusmsg()
+        return await getattr(statement, coroutine_name)(*args, timeout=timeout)
+
+    async def execute(
+            self, connection, coroutine_name, sql_query, *args, timeout=None):
+        statement = await self.prepare(connection, sql_query, timeout=timeout)
+        try:
+            return await self.call_statement_coroutine(
+                statement, coroutine_name, *args, timeout=timeout
+            )
+        except SCHEMA_CHANGE_ERRORS:
+            self.invalidate(connection, sql_query)
+            if connection.is_in_transaction():
+                raise
+        statement = await self.prepare(connection, sql_query, timeout=timeout)
+        return await self.call_statement_coroutine(
+            statement, coroutine_name, *args, timeout=timeout
+        )
+
+    def info(self):
+        return {
+            'statements': len(self.statements),
+            'connections': len(self.connections),
+            'prepares': self.prepares,
+            'reuses': self.reuses,
+            'invalidations': self.invalidations,
+        }
@@ -1,4 +1,14 @@
-from jinja2 import Template
+class Template:
+    def __init__(self, source):
+        self.source = source
+        self.template = None
+
+    def render(self, *args, **kwargs):
+        if self.template is None:
+            from jinja2 import Template as JinjaTemplate
+            self.template = JinjaTemplate(self.source)
+        return self.template.render(*args, **kwargs)
+
 
 sql_create_template = Template(
     """
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import gc
+import os
+import time
+import timeit
+import tracemalloc
+from datetime import datetime
+
+import asyncpg
+
+from asyncpg_utils.builders import (
+    Condition, Delete, Insert, Select, Update, Where,
+)
+from asyncpg_utils.databases import Database, PoolDatabase
+from asyncpg_utils.managers import AbstractHook, TableManager
+
+from .utils import print_results, result, write_results
+
+TABLE_NAME = 'benchmark_posts'
+FIELDS = ['title', 'body', 'pub_date']
+FILTERS = {'title__ilike': 'Post%', 'id__gte': 1}
+
+
+class NoopHook(AbstractHook):
+    async def pre_create(self, data):
+        pass
+
+    async def post_create(self, row):
+        pass
+
+    async def pre_detail(self, pk, pk_field, fields):
+        pass
+
+    async def post_detail(self, row):
+        pass
+
+
+def post_data(index=0):
+    return {
+        'title': 'Post {}'.format(index),
+        'body': 'Post Body {}'.format(index),
+        'pub_date': datetime(2018, 1, 1),
+    }
+
+
+async def setup_table(dsn):
+    conn = await asyncpg.connect(dsn)
+    await conn.execute(
+        """
+        DROP TABLE IF EXISTS {table};
+        CREATE TABLE {table}(
+            id serial PRIMARY KEY,
+            title varchar(128),
+            body text,
+            pub_date timestamp
+        );
+        """.format(table=TABLE_NAME)
+    )
+    await conn.close()
+
+
+async def drop_table(dsn):
+    conn = await asyncpg.connect(dsn)
+    await conn.execute('DROP TABLE IF EXISTS {}'.format(TABLE_NAME))
+    await conn.close()
+
+
+async def run_workers(operation, count, concurrency):
+    async def worker(worker_count):
+        for _ in range(worker_count):
+            await operation()
+
+    sizes = [count // concurrency] * concurrency
+    for index in range(count % concurrency):
+        sizes[index] += 1
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(size) for size in sizes if size])
+    return time.perf_counter() - start
+
+
+def sql_generation(number):
+    table_manager = TableManager(Database(None), TABLE_NAME)
+    where = Where([Condition('id')])
+    cases = (
+        ('create', lambda: Insert(TABLE_NAME, FIELDS).build()),
+        ('list', lambda: table_manager.get_list_query(
+            FIELDS, FILTERS, 'AND', None, 'id', 'DESC', False, 10, None
+        )),
+        ('detail', lambda: Select(
+            TABLE_NAME, fields=FIELDS, where=where
+        ).build()),
+        ('update', lambda: Update(TABLE_NAME, FIELDS, where).build()),
+        ('delete', lambda: Delete(TABLE_NAME, where).build()),
+    )
+    results = []
+    for name, case in cases:
+        if name == 'list':
+            def uncached(case=case):
+                table_manager.sql_cache.clear()
+                return case()
+
+            seconds = min(timeit.repeat(uncached, number=number, repeat=3))
+            results.append(result('sql', 'list (uncached)', number, seconds))
+        seconds = min(timeit.repeat(case, number=number, repeat=3))
+        results.append(result('sql', name, number, seconds))
+    return results
+
+
+def raw_operations(pool, pks):
+    async def create():
+        row = await pool.fetchrow(
+            'INSERT INTO {} (title, body, pub_date) VALUES ($1, $2, $3) '
+            'RETURNING *'.format(TABLE_NAME), *post_data().values()
+        )
+        pks.append(row['id'])
+
+    async def list_rows():
+        await pool.fetch(
+            'SELECT * FROM {} ORDER BY id DESC LIMIT 10'.format(TABLE_NAME)
+        )
+
+    async def detail():
+        await pool.fetchrow(
+            'SELECT * FROM {} WHERE id = $1'.format(TABLE_NAME), pks[-1]
+        )
+
+    async def update():
+        await pool.fetchrow(
+            'UPDATE {} SET title = $1 WHERE id = $2 RETURNING *'.format(
+                TABLE_NAME
+            ), 'Updated', pks[-1]
+        )
+
+    async def delete():
+        await pool.fetchrow(
+            'DELETE FROM {} WHERE id = $1'.format(TABLE_NAME), pks.pop()
+        )
+
+    return create, list_rows, detail, update, delete
+
+
+def manager_operations(table_manager, pks):
+    async def create():
+        row = await table_manager.create(post_data())
+        pks.append(row['id'])
+
+    async def list_rows():
+        await table_manager.list(order_by='id', order_by_sort='DESC', limit=10)
+
+    async def detail():
+        await table_manager.detail(pks[-1])
+
+    async def update():
+        await table_manager.update(pks[-1], {'title': 'Updated'})
+
+    async def delete():
+        await table_manager.delete(pks.pop())
+
+    return create, list_rows, detail, update, delete
+
+
+async def round_trips(dsn, count, concurrency_levels):
+    results = []
+    for concurrency in concurrency_levels:
+        targets = (
+            ('asyncpg', None),
+            ('PoolDatabase', PoolDatabase(
+                dsn, min_size=concurrency, max_size=concurrency
+            )),
+            ('Database', Database(dsn)),
+            (
+                'Database(reuse_connection)',
+                Database(dsn, reuse_connection=True)
+            ),
+        )
+        for target_name, database in targets:
+            pool = None
+            pks = []
+            if database is None:
+                pool = await asyncpg.create_pool(
+                    dsn, min_size=concurrency, max_size=concurrency
+                )
+                operations = raw_operations(pool, pks)
+            else:
+                if isinstance(database, PoolDatabase):
+                    await database.init_pool()
+                operations = manager_operations(
+                    TableManager(database, TABLE_NAME), pks
+                )
+            try:
+                for name, operation in zip(
+                        ('create', 'list', 'detail', 'update', 'delete'),
+                        operations):
+                    seconds = await run_workers(operation, count, concurrency)
+                    results.append(result(
+                        'roundtrip', '{} {}'.format(target_name, name), count,
+                        seconds, concurrency=concurrency
+                    ))
+            finally:
+                if pool is not None:
+                    await pool.close()
+                if isinstance(database, (Database, PoolDatabase)):
+                    await database.close()
+    return results
+
+
+async def memory_per_row(dsn, rows):
+    database = PoolDatabase(dsn, min_size=1, max_size=1)
+    await database.init_pool()
+    table_manager = TableManager(database, TABLE_NAME)
+    await table_manager.bulk_create(
+        [post_data(index) for index in range(rows)]
+    )
+    results = []
+    variants = (
+        ('record', {}),
+        ('tuple', {'result_type': 'tuple'}),
+        ('namedtuple', {'result_type': 'namedtuple'}),
+        ('slots', {'result_type': 'slots'}),
+        ('columns', {'as_columns': True}),
+    )
+    try:
+        for name, kwargs in variants:
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            data = await table_manager.list(**kwargs)
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del data
+            results.append(result(
+                'memory', 'list {}'.format(name), rows, seconds,
+                bytes_per_row=current / rows, peak_bytes_per_row=peak / rows
+            ))
+    finally:
+        await database.execute('DELETE FROM {}'.format(TABLE_NAME))
+        await database.close()
+    return results
+
+
+async def hook_overhead(number):
+    results = []
+    for hooks in ((), (NoopHook,), (NoopHook, NoopHook, NoopHook)):
+        for concurrent in (False, True):
+            if concurrent and len(hooks) < 2:
+                continue
+            table_manager = TableManager(
+                Database(None), TABLE_NAME, hooks=hooks,
+                concurrent_hooks=concurrent
+            )
+            start = time.perf_counter()
+            for _ in range(number):
+                await table_manager.trigger_hooks('pre_create', None)
+            seconds = time.perf_counter() - start
+            results.append(result(
+                'hooks', '{} hooks{}'.format(
+                    len(hooks), ' (concurrent)' if concurrent else ''
+                ), number, seconds
+            ))
+    return results
+
+
+async def run(args):
+    results = sql_generation(args.number)
+    results += await hook_overhead(args.number)
+    await setup_table(args.dsn)
+    try:
+        results += await round_trips(args.dsn, args.count, args.concurrency)
+        results += await memory_per_row(args.dsn, args.rows)
+    finally:
+        await drop_table(args.dsn)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark asyncpg_utils against a local postgres'
+    )
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'))
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--output', help='json output file, - for stdout')
+    args = parser.parse_args(argv)
+    if not args.dsn:
+        parser.error('--dsn or DATABASE_URL is required')
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(run(args))
+    print_results(results)
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from .utils import print_results, result, write_results
+
+MODULES = (
+    'asyncpg',
+    'asyncpg_utils.databases',
+    'asyncpg_utils.managers',
+    'asyncpg_utils.templates',
+)
+OPTIONAL_MODULES = ('jinja2', 'numpy')
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [name for name in {optional!r} if name in sys.modules]]))
+"""
+
+
+def import_time(module, repeat):
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            SCRIPT.format(module=module, optional=OPTIONAL_MODULES)
+        ])
+        seconds, loaded = json.loads(output.decode('utf-8'))
+        timings.append(seconds)
+    return min(timings), loaded
+
+
+def run(args):
+    results = []
+    for module in args.modules:
+        seconds, loaded = import_time(module, args.repeat)
+        results.append(result(
+            'import', module, 1, seconds, optional_modules=loaded
+        ))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Measure import time of asyncpg_utils modules'
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--modules', nargs='+', default=list(MODULES))
+    parser.add_argument('--output', help='json output file, - for stdout')
+    args = parser.parse_args(argv)
+    results = run(args)
+    print_results(results)
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
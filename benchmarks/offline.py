@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from asyncpg_utils.databases import AbstractDatabase
+from asyncpg_utils.managers import AbstractHook, TableManager
+
+from .utils import print_results, result, write_results
+
+TABLE_NAME = 'posts'
+COLUMN_TYPES = [
+    {'attname': 'id', 'type': 'integer'},
+    {'attname': 'title', 'type': 'character varying(128)'},
+    {'attname': 'body', 'type': 'text'},
+    {'attname': 'pub_date', 'type': 'timestamp without time zone'},
+]
+FIELDS = ['id', 'title', 'body', 'pub_date']
+JOINS = {
+    'comments': {
+        'type': 'LEFT JOIN', 'source': 'posts.id', 'target': 'comments.post_id'
+    },
+}
+
+
+class FakeTransaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def start(self):
+        self.connection.in_transaction = True
+
+    async def commit(self):
+        self.connection.in_transaction = False
+
+    async def rollback(self):
+        self.connection.in_transaction = False
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.in_transaction = False
+
+    async def fetch(self, sql_query, *args, timeout=None):
+        if 'pg_attribute' in sql_query:
+            return COLUMN_TYPES
+        return self.rows
+
+    async def fetchrow(self, sql_query, *args, timeout=None):
+        return self.rows[0] if self.rows else None
+
+    async def fetchval(self, sql_query, *args, timeout=None):
+        return 1
+
+    async def execute(self, sql_query, *args, timeout=None):
+        return 'UPDATE {}'.format(len(self.rows))
+
+    async def copy_records_to_table(
+            self, table_name, records, columns=None, schema_name=None,
+            timeout=None):
+        return 'COPY {}'.format(len(records))
+
+    async def copy_from_query(self, sql_query, *args, output, **kwargs):
+        return 'COPY {}'.format(len(self.rows))
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def is_in_transaction(self):
+        return self.in_transaction
+
+    def get_server_pid(self):
+        return 0
+
+
+class FakeDatabase(AbstractDatabase):
+    def __init__(self, rows):
+        self.connection = FakeConnection(rows)
+
+    async def get_connection(self):
+        return self.connection
+
+    async def release_connection(self, connection):
+        pass
+
+
+class NoopHook(AbstractHook):
+    async def pre_list(self, *args):
+        pass
+
+    async def post_list(self, rows):
+        pass
+
+
+def make_rows(count):
+    return [
+        {
+            'id': index,
+            'title': 'Post {}'.format(index),
+            'body': 'Post Body {}'.format(index),
+            'pub_date': datetime(2018, 1, 1),
+        }
+        for index in range(1, count + 1)
+    ]
+
+
+def get_cases(table_manager, rows):
+    data = {key: value for key, value in rows[0].items() if key != 'id'}
+    return (
+        ('parse_filters', lambda: table_manager.parse_filters(
+            {'title__ilike': 'Post%', 'id__in': [1, 2], 'pub_date__gte': 1}
+        )),
+        ('get_list_query', lambda: table_manager.get_list_query(
+            FIELDS, {'title__ilike': 'Post%', 'id__gt': 1}, 'AND', JOINS,
+            'pub_date', 'DESC', False, 10, 10
+        )),
+        ('create', lambda: table_manager.create(data)),
+        ('list', lambda: table_manager.list()),
+        ('list fields filters', lambda: table_manager.list(
+            fields=FIELDS, filters={'title__ilike': 'Post%', 'id__in': [1, 2]}
+        )),
+        ('list joins order limit', lambda: table_manager.list(
+            joins=JOINS, order_by='posts.pub_date', order_by_sort='DESC',
+            limit=10, offset=10
+        )),
+        ('list count', lambda: table_manager.list(count=True)),
+        ('list tuple', lambda: table_manager.list(result_type='tuple')),
+        ('list slots', lambda: table_manager.list(result_type='slots')),
+        ('list columns', lambda: table_manager.list(as_columns=True)),
+        ('paginate', lambda: table_manager.paginate(
+            len(rows) - 1, order_by='pub_date'
+        )),
+        ('detail', lambda: table_manager.detail(1)),
+        ('update', lambda: table_manager.update(1, {'title': 'Title'})),
+        ('delete', lambda: table_manager.delete(1)),
+        ('delete_many', lambda: table_manager.delete_many([1, 2])),
+        ('bulk_create', lambda: table_manager.bulk_create(rows)),
+        ('bulk_update', lambda: table_manager.bulk_update(rows)),
+        ('upsert', lambda: table_manager.upsert(rows)),
+        ('export', lambda: table_manager.export(None)),
+    )
+
+
+async def call(case):
+    value = case()
+    if asyncio.iscoroutine(value):
+        value = await value
+    return value
+
+
+async def measure(case, number):
+    await call(case)
+    start = time.perf_counter()
+    for _ in range(number):
+        await call(case)
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await call(case)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.clear_traces()
+        for _ in range(100):
+            await call(case)
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, retained / 100
+
+
+async def run(args):
+    rows = make_rows(args.rows)
+    variants = (
+        ('', {}),
+        (' (uncached sql)', {'sql_cache_size': 0}),
+        (' (hook)', {'hooks': (NoopHook,)}),
+    )
+    results = []
+    for suffix, kwargs in variants:
+        table_manager = TableManager(FakeDatabase(rows), TABLE_NAME, **kwargs)
+        for name, case in get_cases(table_manager, rows):
+            if args.filter and args.filter not in name:
+                continue
+            seconds, peak, retained = await measure(case, args.number)
+            results.append(result(
+                'offline', name + suffix, args.number, seconds,
+                peak_bytes_per_op=peak, retained_bytes_per_op=retained
+            ))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark TableManager against an in-memory database'
+    )
+    parser.add_argument('--number', type=int, default=10000)
+    parser.add_argument('--rows', type=int, default=10)
+    parser.add_argument('--filter', help='only run cases containing this text')
+    parser.add_argument('--output', help='json output file, - for stdout')
+    args = parser.parse_args(argv)
+    loop = asyncio.get_event_loop()
+    results = loop.run_until_complete(run(args))
+    print_results(results)
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
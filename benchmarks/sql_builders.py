@@ -0,0 +1,70 @@
+import timeit
+
+from asyncpg_utils.builders import Condition, Delete, Insert, Join, Select, Update, Where
+from asyncpg_utils.templates import (
+    sql_create_template,
+    sql_delete_template,
+    sql_detail_template,
+    sql_list_template,
+    sql_update_template,
+)
+
+number = 20000
+field_names = ['title', 'body', 'pub_date']
+joins = {'comments': {'type': 'LEFT JOIN', 'source': 'posts.id', 'target': 'comments.post_id'}}
+filters = {'title': {'lookup': 'ilike'}, 'id': {'lookup': 'in'}, 'pub_date': {'lookup': 'gte'}}
+
+cases = (
+    (
+        'create',
+        lambda: sql_create_template.render(table_name='posts', field_names=field_names),
+        lambda: Insert('posts', field_names).build(),
+    ),
+    (
+        'list',
+        lambda: sql_list_template.render(
+            table_name='posts', fields=field_names, filters=filters, filters_operator='AND',
+            joins=joins, order_by='pub_date', order_by_sort='DESC', limit=10, offset=10
+        ),
+        lambda: Select(
+            'posts',
+            fields=field_names,
+            joins=[Join(table_name, value['source'], value['target'], value['type'])
+                   for table_name, value in joins.items()],
+            where=Where([Condition(field, value['lookup']) for field, value in filters.items()]),
+            order_by='pub_date',
+            order_by_sort='DESC',
+            limit=10,
+            offset=10
+        ).build(),
+    ),
+    (
+        'detail',
+        lambda: sql_detail_template.render(table_name='posts', fields=field_names, pk_field='id'),
+        lambda: Select('posts', fields=field_names, where=Where([Condition('id')])).build(),
+    ),
+    (
+        'update',
+        lambda: sql_update_template.render(table_name='posts', field_names=field_names, pk_field='id'),
+        lambda: Update('posts', field_names, Where([Condition('id')])).build(),
+    ),
+    (
+        'delete',
+        lambda: sql_delete_template.render(table_name='posts', pk_field='id'),
+        lambda: Delete('posts', Where([Condition('id')])).build(),
+    ),
+)
+
+
+def main():
+    print('{:<8} {:>14} {:>14} {:>8}'.format('query', 'template ns/op', 'builder ns/op', 'speedup'))
+    for name, template, builder in cases:
+        template_time = min(timeit.repeat(template, number=number, repeat=3)) / number * 1e9
+        builder_time = min(timeit.repeat(builder, number=number, repeat=3)) / number * 1e9
+        print('{:<8} {:>14.0f} {:>14.0f} {:>7.1f}x'.format(
+            name, template_time, builder_time, template_time / builder_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
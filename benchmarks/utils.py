@@ -0,0 +1,63 @@
+import json
+import platform
+import sys
+import time
+
+import asyncpg
+
+
+def result(group, name, operations, seconds, **extra):
+    data = {
+        'group': group,
+        'name': name,
+        'operations': operations,
+        'seconds': seconds,
+        'ops_per_sec': operations / seconds if seconds else None,
+        'ns_per_op': seconds / operations * 1e9 if operations else None,
+    }
+    data.update(extra)
+    return data
+
+
+def metadata():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'asyncpg': asyncpg.__version__,
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+    }
+
+
+def write_results(results, output=None):
+    data = {'metadata': metadata(), 'results': results}
+    if output is None:
+        return
+    if output == '-':
+        json.dump(data, sys.stdout, indent=2, default=str)
+        sys.stdout.write('\n')
+        return
+    with open(output, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+
+
+def print_results(results, stream=sys.stderr):
+    stream.write('{:<10} {:<40} {:>10} {:>14} {:>14}\n'.format(
+        'group', 'name', 'ops', 'ops/sec', 'ns/op'
+    ))
+    for data in results:
+        stream.write('{:<10} {:<40} {:>10} {:>14.1f} {:>14.0f}\n'.format(
+            data['group'], data['name'], data['operations'],
+            data['ops_per_sec'] or 0, data['ns_per_op'] or 0
+        ))
+        extra = {
+            key: value for key, value in data.items()
+            if key not in (
+                'group', 'name', 'operations', 'seconds', 'ops_per_sec',
+                'ns_per_op'
+            )
+        }
+        if extra:
+            stream.write('{:<10} {}\n'.format('', ', '.join(
+                '{}={}'.format(key, value) for key, value in sorted(extra.items())
+            )))
@@ -63,9 +63,13 @@ setup(
         'Programming Language :: Python :: 3.6',
         'Topic :: Software Development :: Libraries',
     ],
-    packages=find_packages(exclude=['docs', 'tests*']),
+    packages=find_packages(exclude=['benchmarks*', 'docs', 'tests*']),
     setup_requires=['pytest-runner'],
     install_requires=install_requirements,
+    extras_require={
+        'numpy': ['numpy'],
+        'templates': ['Jinja2>=2.10'],
+    },
     tests_require=tests_requirements,
     cmdclass={
         'version': VersionCommand,
@@ -79,8 +79,15 @@ def database():
 
 
 @pytest.fixture
-def pool_database():
-    return PoolDatabase(dsn)
+def pool_database(request, event_loop):
+    pool_database = PoolDatabase(dsn)
+
+    def teardown():
+        if pool_database.pool is not None:
+            event_loop.run_until_complete(pool_database.pool.close())
+
+    request.addfinalizer(teardown)
+    return pool_database
 
 
 @pytest.fixture
@@ -111,6 +118,12 @@ class TestHook(AbstractHook):
     async def post_create(self, *args, **kwargs):
         self.table_manager.hook_event_mock.post_create(*args, **kwargs)
 
+    async def pre_bulk_create(self, *args, **kwargs):
+        self.table_manager.hook_event_mock.pre_bulk_create(*args, **kwargs)
+
+    async def post_bulk_create(self, *args, **kwargs):
+        self.table_manager.hook_event_mock.post_bulk_create(*args, **kwargs)
+
     async def pre_list(self, *args, **kwargs):
         self.table_manager.hook_event_mock.pre_list(*args, **kwargs)
 
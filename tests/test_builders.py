@@ -0,0 +1,194 @@
+import pytest
+
+from asyncpg_utils.builders import (
+    BulkUpdate,
+    Condition,
+    Delete,
+    Insert,
+    Join,
+    Keyset,
+    Parameter,
+    Select,
+    Update,
+    Upsert,
+    Where,
+)
+
+
+@pytest.mark.parametrize('lookup,expected_result', [
+    ('exact', 'field = $1'),
+    ('like', 'field LIKE $1'),
+    ('ilike', 'field ILIKE $1'),
+    ('in', 'field = any($1)'),
+    ('gt', 'field > $1'),
+    ('gte', 'field >= $1'),
+    ('lt', 'field < $1'),
+    ('lte', 'field <= $1'),
+])
+def test_condition_build(lookup, expected_result):
+    assert Select('t', where=Where([Condition('field', lookup)])).build() == (
+        'SELECT * FROM t WHERE ' + expected_result
+    )
+
+
+def test_condition_invalid_lookup():
+    with pytest.raises(ValueError):
+        Condition('field', 'invalid')
+
+
+def test_where_nested_build():
+    where = Where([
+        Where([Condition('a'), Condition('b')], 'OR'),
+        Condition('c', 'gt'),
+        Where([Condition('d')], 'OR'),
+    ])
+    assert Delete('t', where).build() == (
+        'DELETE FROM t WHERE (a = $1 OR b = $2) AND c > $3 AND d = $4'
+    )
+
+
+def test_select_build():
+    select = Select(
+        'comments',
+        fields=['comments.id', 'posts.title'],
+        joins=[Join('posts', 'comments.post_id', 'posts.id', 'LEFT JOIN')],
+        where=Where([Condition('comments.id', 'in')]),
+        order_by='comments.id',
+        order_by_sort='DESC',
+        limit=10,
+        offset=20
+    )
+    assert select.build() == (
+        'SELECT comments.id, posts.title FROM comments '
+        'LEFT JOIN posts ON comments.post_id = posts.id '
+        'WHERE comments.id = any($1) ORDER BY comments.id DESC '
+        'LIMIT 10 OFFSET 20'
+    )
+    assert Select('t', count=True, where=Where([])).build() == (
+        'SELECT COUNT(1) FROM t'
+    )
+
+
+def test_select_parameter_build():
+    select = Select('t', where=Where([Condition('a')]), limit=Parameter(), offset=Parameter())
+    assert select.build() == 'SELECT * FROM t WHERE a = $1 LIMIT $2 OFFSET $3'
+
+
+def test_select_keyset_build():
+    select = Select(
+        't',
+        where=Where([Where([Condition('a'), Condition('b')], 'OR'), Keyset(['c', 'id'], 'DESC')]),
+        order_by=['c', 'id'],
+        order_by_sort='DESC',
+        limit=10
+    )
+    assert select.build() == (
+        'SELECT * FROM t WHERE (a = $1 OR b = $2) AND (c, id) < ($3, $4) '
+        'ORDER BY c DESC, id DESC LIMIT 10'
+    )
+    assert Keyset(['id']).build(iter(['$1'])) == '(id) > ($1)'
+
+
+def test_insert_build():
+    assert Insert('t', ['a', 'b']).build() == (
+        'INSERT INTO t (a, b) VALUES ($1, $2) RETURNING *'
+    )
+    assert Insert('t', ['a'], returning=None).build() == (
+        'INSERT INTO t (a) VALUES ($1)'
+    )
+    assert Insert('t', ['a', 'b'], rows=2).build() == (
+        'INSERT INTO t (a, b) VALUES ($1, $2), ($3, $4) RETURNING *'
+    )
+
+
+def test_update_build():
+    assert Update('t', ['a', 'b'], Where([Condition('id')])).build() == (
+        'UPDATE t SET a = $1, b = $2 WHERE id = $3 RETURNING *'
+    )
+
+
+def test_delete_build():
+    assert Delete('t', Where([Condition('id')]), returning='id').build() == (
+        'DELETE FROM t WHERE id = $1 RETURNING id'
+    )
+
+
+def test_bulk_update_build():
+    assert BulkUpdate('t', 'id', ['id', 'a'], ['integer', 'text']).build() == (
+        'UPDATE t SET a = bulk_data.a '
+        'FROM unnest($1::integer[], $2::text[]) AS bulk_data (id, a) '
+        'WHERE t.id = bulk_data.id RETURNING t.*'
+    )
+    assert BulkUpdate('t', 'id', ['a', 'id'], ['text', 'integer'], returning=None).build() == (
+        'UPDATE t SET a = bulk_data.a '
+        'FROM unnest($1::text[], $2::integer[]) AS bulk_data (a, id) '
+        'WHERE t.id = bulk_data.id'
+    )
+    with pytest.raises(ValueError):
+        BulkUpdate('t', 'id', ['id'], ['integer'])
+
+
+def test_upsert_build():
+    assert Upsert('t', ['id', 'a'], ['integer', 'text'], ['id'], ['a']).build() == (
+        'INSERT INTO t (id, a) SELECT * FROM unnest($1::integer[], $2::text[]) '
+        'ON CONFLICT (id) DO UPDATE SET a = EXCLUDED.a RETURNING *'
+    )
+    assert Upsert('t', ['id'], ['integer'], ['id'], returning=None).build() == (
+        'INSERT INTO t (id) SELECT * FROM unnest($1::integer[]) '
+        'ON CONFLICT (id) DO NOTHING'
+    )
+
+
+def normalize(sql_query):
+    return ' '.join(sql_query.split())
+
+
+def test_builders_match_templates():
+    from asyncpg_utils.templates import (
+        sql_create_template,
+        sql_delete_template,
+        sql_detail_template,
+        sql_list_template,
+        sql_update_template,
+    )
+
+    assert Insert('t', ['a', 'b']).build() == normalize(
+        sql_create_template.render(table_name='t', field_names=['a', 'b'])
+    )
+    assert Select(
+        't',
+        fields=['a', 'b'],
+        joins=[Join('j', 't.j_id', 'j.id')],
+        where=Where([Condition('a', 'in'), Condition('b', 'lte')], 'OR'),
+        order_by='a',
+        limit=1,
+        offset=2
+    ).build() == normalize(sql_list_template.render(
+        table_name='t',
+        fields=['a', 'b'],
+        joins={'j': {'type': 'INNER JOIN', 'source': 't.j_id', 'target': 'j.id'}},
+        filters={'a': {'lookup': 'in'}, 'b': {'lookup': 'lte'}},
+        filters_operator='OR',
+        order_by='a',
+        order_by_sort='ASC',
+        limit=1,
+        offset=2
+    ))
+    assert Select('t', fields=['a'], where=Where([Condition('id')])).build() == normalize(
+        sql_detail_template.render(table_name='t', fields=['a'], pk_field='id')
+    )
+    assert Update('t', ['a'], Where([Condition('id')])).build() == normalize(
+        sql_update_template.render(table_name='t', field_names=['a'], pk_field='id')
+    )
+    assert Delete('t', Where([Condition('id')])).build() == normalize(
+        sql_delete_template.render(table_name='t', pk_field='id')
+    )
+
+
+def test_templates_are_lazy():
+    from asyncpg_utils.templates import Template
+
+    template = Template('{{ value }}')
+    assert template.template is None
+    assert template.render(value=1) == '1'
+    assert template.template is not None
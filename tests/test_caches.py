@@ -0,0 +1,103 @@
+import pytest
+
+from asyncpg_utils.caches import LRUCache, MemoryCache
+
+
+def test_lru_cache_get_set():
+    cache = LRUCache(maxsize=2)
+    assert cache.get('key') is None
+    assert cache.set('key', 'value') == 'value'
+    assert cache.get('key') == 'value'
+    assert 'key' in cache
+    assert len(cache) == 1
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert cache.evictions == 0
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('key1', 'value1')
+    cache.set('key2', 'value2')
+    cache.get('key1')
+    cache.set('key3', 'value3')
+    assert 'key1' in cache
+    assert 'key2' not in cache
+    assert 'key3' in cache
+    assert cache.evictions == 1
+    assert cache.info() == {
+        'hits': 1, 'misses': 0, 'evictions': 1, 'size': 2, 'maxsize': 2
+    }
+
+
+def test_lru_cache_on_evict():
+    evicted = []
+    cache = LRUCache(maxsize=1, on_evict=lambda key, value: evicted.append((key, value)))
+    cache.set('key1', 'value1')
+    cache.set('key2', 'value2')
+    assert evicted == [('key1', 'value1')]
+    cache.clear()
+    assert evicted == [('key1', 'value1'), ('key2', 'value2')]
+
+
+def test_lru_cache_disabled():
+    cache = LRUCache(maxsize=0)
+    assert cache.set('key', 'value') == 'value'
+    assert 'key' not in cache
+    assert cache.evictions == 0
+
+
+def test_lru_cache_delete_clear():
+    cache = LRUCache()
+    cache.set('key1', 'value1')
+    cache.set('key2', 'value2')
+    assert cache.delete('key1') is True
+    assert cache.delete('key1') is False
+    cache.clear()
+    assert len(cache) == 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_memory_cache():
+    clock = FakeClock()
+    cache = MemoryCache(maxsize=2, ttl=10, clock=clock)
+    assert await cache.get('key1') is None
+    await cache.set('key1', 'value1')
+    await cache.set('key2', 'value2', ttl=20)
+    assert await cache.get('key1') == 'value1'
+    assert len(cache) == 2
+
+    clock.now = 10
+    assert await cache.get('key1') is None
+    assert await cache.get('key2') == 'value2'
+    assert cache.expirations == 1
+
+    await cache.set('key3', 'value3', ttl=0)
+    await cache.set('key4', 'value4')
+    assert await cache.get('key2') is None
+    clock.now = 1000
+    assert await cache.get('key3') == 'value3'
+    assert cache.info() == {
+        'hits': 3,
+        'misses': 3,
+        'hit_ratio': 0.5,
+        'evictions': 1,
+        'expirations': 1,
+        'size': 2,
+        'maxsize': 2,
+    }
+
+    await cache.delete('key3', 'key4')
+    assert len(cache) == 0
+    await cache.set('key1', 'value1')
+    await cache.clear()
+    assert len(cache) == 0
+    assert MemoryCache().info()['hit_ratio'] == 0.0
@@ -1,6 +1,13 @@
+import asyncio
+import io
+import sys
+
+import asyncpg
 import pytest
 
-from asyncpg_utils.databases import PoolDatabase
+from asyncpg_utils.databases import Database, PoolDatabase, Replica
+
+from .conftest import dsn
 
 pytestmark = pytest.mark.asyncio
 
@@ -103,3 +110,342 @@ async def test_database_transaction(selected_database, post_data):
         """
     )
     assert len(rows) == 0
+
+
+@pytest.mark.parametrize(
+    'selected_database', (
+        pytest.lazy_fixture('database'),
+        pytest.lazy_fixture('pool_database')
+    )
+)
+async def test_database_bulk_insert(selected_database, post_data):
+    if isinstance(selected_database, PoolDatabase):
+        await selected_database.init_pool()
+
+    assert await selected_database.bulk_insert('posts', []) == 0
+    assert await selected_database.bulk_insert('public.posts', [post_data] * 5, batch_size=2) == 5
+    rows = await selected_database.query('SELECT * FROM posts')
+    assert len(rows) == 5
+    assert rows[0]['title'] == post_data['title']
+    assert rows[0]['pub_date'] == post_data['pub_date']
+
+
+@pytest.mark.parametrize(
+    'selected_database', (
+        pytest.lazy_fixture('database'),
+        pytest.lazy_fixture('pool_database')
+    )
+)
+async def test_database_bulk_insert_returning(selected_database, post_data):
+    if isinstance(selected_database, PoolDatabase):
+        await selected_database.init_pool()
+
+    assert await selected_database.bulk_insert('posts', [], returning=True) == []
+    rows = await selected_database.bulk_insert(
+        'posts', [('Title 1', 'Body 1'), ('Title 2', 'Body 2'), ('Title 3', 'Body 3')],
+        columns=['title', 'body'], returning=True, batch_size=2
+    )
+    assert [row['title'] for row in rows] == ['Title 1', 'Title 2', 'Title 3']
+    assert all(row['id'] for row in rows)
+
+
+async def test_database_bulk_insert_invalid_rows(database, post_data):
+    with pytest.raises(ValueError):
+        await database.bulk_insert('posts', [post_data, dict(post_data, extra=1)])
+    with pytest.raises(ValueError):
+        await database.bulk_insert('posts', [post_data, {'title': 'Title'}])
+    with pytest.raises(ValueError):
+        await database.bulk_insert('posts', [('Title', 'Body')])
+    with pytest.raises(ValueError):
+        await database.bulk_insert('posts', [{'title': 'Title'}], columns=['title', 'body'])
+    assert await database.bulk_insert(
+        'posts', [dict(post_data, extra=1)], columns=['title', 'body']
+    ) == 1
+
+
+async def test_database_bulk_insert_rollback(database, post_data):
+    invalid_data = post_data.copy()
+    invalid_data['title'] = 'x' * 256
+
+    with pytest.raises(Exception):
+        await database.bulk_insert('posts', [post_data, post_data, invalid_data], batch_size=2)
+
+    rows = await database.query('SELECT * FROM posts')
+    assert len(rows) == 0
+
+
+@pytest.mark.parametrize(
+    'selected_database', (
+        pytest.lazy_fixture('database'),
+        pytest.lazy_fixture('pool_database')
+    )
+)
+async def test_database_stream(selected_database, post_data):
+    if isinstance(selected_database, PoolDatabase):
+        await selected_database.init_pool()
+
+    await selected_database.bulk_insert('posts', [post_data] * 5)
+
+    rows = []
+    async with selected_database.stream(
+            'SELECT * FROM posts WHERE title = $1', post_data['title'], prefetch=2) as stream:
+        async for row in stream:
+            rows.append(row)
+    assert len(rows) == 5
+    assert rows[0]['title'] == post_data['title']
+    async for row in stream:
+        assert False
+
+    with pytest.raises(RuntimeError):
+        async for row in selected_database.stream('SELECT * FROM posts'):
+            pass
+
+    async with selected_database.stream('SELECT * FROM posts', prefetch=2) as stream:
+        async for row in stream:
+            break
+    assert row['title'] == post_data['title']
+    assert stream.closed is True
+    if isinstance(selected_database, PoolDatabase):
+        assert selected_database.pool.get_idle_size() == selected_database.pool.get_size()
+
+
+async def test_database_stream_error(pool_database):
+    await pool_database.init_pool()
+
+    with pytest.raises(Exception):
+        async with pool_database.stream('SELECT 1 / 0') as stream:
+            async for row in stream:
+                pass
+    assert pool_database.pool.get_idle_size() == pool_database.pool.get_size()
+
+
+async def test_pool_database_gather(pool_database, post_table, post_data):
+    await pool_database.init_pool()
+    row = await pool_database.insert('posts', post_data)
+
+    results = await pool_database.gather(
+        'SELECT * FROM posts',
+        ('SELECT * FROM posts WHERE id = $1', row['id']),
+        pool_database.query_one('SELECT COUNT(1) FROM posts'),
+        post_table.detail(row['id']),
+        concurrency=2
+    )
+    assert results == [[row], [row], (1,), row]
+
+
+async def test_pool_database_gather_error(pool_database):
+    await pool_database.init_pool()
+
+    with pytest.raises(Exception):
+        await pool_database.gather(
+            ('SELECT pg_sleep(10)',), ('SELECT 1 / 0',), ('SELECT 1',), concurrency=2
+        )
+    assert pool_database.pool.get_idle_size() == pool_database.pool.get_size()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await pool_database.gather(('SELECT pg_sleep(10)',), timeout=0.1)
+
+
+async def test_database_reuse_connection(post_data):
+    database = Database(dsn, reuse_connection=True, health_check_interval=0)
+    try:
+        assert database.get_idle_connections() == 0
+        pid = await database.query_one('SELECT pg_backend_pid() AS pid')
+        assert database.get_idle_connections() == 1
+        assert await database.query_one('SELECT pg_backend_pid() AS pid') == pid
+
+        async with database.acquire(transaction=True) as conn:
+            assert conn is database.shared_connection
+            other_pid = await database.query_one('SELECT pg_backend_pid() AS pid')
+            assert other_pid != pid
+            await database.insert('posts', post_data, connection=conn, close_connection=False)
+        assert len(await database.query('SELECT * FROM posts')) == 1
+
+        conn = await database.get_connection()
+        await conn.execute('BEGIN')
+        await database.release_connection(conn)
+        assert conn.is_closed()
+        assert database.shared_connection is None
+
+        conn = await database.get_connection()
+        conn.terminate()
+        await database.release_connection(conn)
+        new_pid = await database.query_one('SELECT pg_backend_pid() AS pid')
+        assert new_pid != pid
+        assert database.connections_in_use == 0
+
+        conn = await database.get_connection()
+        await conn.close()
+        await database.query('SELECT 1')
+        shared_connection = database.shared_connection
+        assert shared_connection is not None and shared_connection is not conn
+        await database.query('SELECT 1')
+        assert database.shared_connection is shared_connection
+        assert database.get_idle_connections() == 1
+    finally:
+        await database.close()
+    assert database.shared_connection is None
+
+
+async def test_database_reuse_connection_health_check(post_data):
+    database = Database(dsn, reuse_connection=True, health_check_interval=0)
+    killer = Database(dsn)
+    try:
+        row = await database.query_one('SELECT pg_backend_pid() AS pid')
+        await killer.query('SELECT pg_terminate_backend($1)', row['pid'])
+        await asyncio.sleep(0.1)
+        assert await database.query_one('SELECT 1 AS value') == (1,)
+        assert database.shared_connection.get_server_pid() != row['pid']
+    finally:
+        await database.close()
+
+
+async def test_pool_database_replicas(post_data):
+    replica_pool = await asyncpg.create_pool(
+        dsn, min_size=1, max_size=1,
+        server_settings={'application_name': 'replica'}
+    )
+    database = PoolDatabase(
+        dsn, replicas=[Replica(dsn, pool=replica_pool), (dsn, 0)],
+        min_size=1, max_size=1
+    )
+    await database.init_pool()
+    try:
+        assert database.replicas[1].weight == 0
+        name_query = "SELECT current_setting('application_name') AS name"
+        assert (await database.query_one(name_query))['name'] == 'replica'
+        assert database.replica_connections == {}
+
+        await database.insert('posts', post_data)
+        assert (await database.query_one(name_query))['name'] == 'replica'
+        assert await database.execute(name_query) == 'SELECT 1'
+        row = await database.query_one('SELECT id FROM posts FOR UPDATE')
+        assert row['id']
+        assert database.is_read_query('fetch', ' select 1') is True
+        assert database.is_read_query('fetch', 'SELECT 1 FOR SHARE') is False
+        assert database.is_read_query('fetch', 'INSERT INTO posts DEFAULT VALUES') is False
+        assert database.is_read_query('execute', 'SELECT 1') is False
+
+        database.read_your_writes = 60
+        database.last_write_at = None
+        async with database.stream('SELECT * FROM posts') as stream:
+            async for row in stream:
+                pass
+        await database.export('SELECT * FROM posts', output=io.BytesIO())
+        async with database.acquire():
+            pass
+        assert database.last_write_at is None
+        assert (await database.query_one(name_query))['name'] == 'replica'
+
+        await asyncio.ensure_future(database.insert('posts', post_data))
+        if sys.version_info >= (3, 7):
+            assert (await database.query_one(name_query))['name'] == 'replica'
+
+        await database.insert('posts', post_data)
+        assert (await database.query_one(name_query))['name'] != 'replica'
+        database.last_write_at = None
+        async with database.acquire(transaction=True):
+            pass
+        assert (await database.query_one(name_query))['name'] != 'replica'
+    finally:
+        await database.close()
+
+
+async def test_pool_database_replicas_lag(post_data):
+    database = PoolDatabase(
+        dsn, replicas=[dsn], max_replica_lag=1, min_size=1, max_size=1
+    )
+    await database.init_pool()
+    try:
+        replica = database.replicas[0]
+        assert await database.choose_replica() is replica
+        assert replica.lag == 0
+
+        replica.lag = 5
+        database.replicas_checked_at = None
+        assert await database.choose_replica() is None
+        await database.replicas_check_task
+        assert replica.lag == 0
+        assert await database.choose_replica() is replica
+
+        database.max_replica_lag = -1
+        database.replicas_checked_at = None
+        assert await database.choose_replica() is None
+        assert len(await database.query('SELECT 1')) == 1
+
+        database.replica_check_timeout = 0.1
+        conn = await replica.pool.acquire()
+        await database.check_replicas()
+        assert replica.lag is None
+        await replica.pool.release(conn)
+
+        await replica.pool.close()
+        await database.check_replicas()
+        assert replica.lag is None
+    finally:
+        await database.close()
+
+
+async def test_database_unit_of_work(database, post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+
+    async with database.unit_of_work() as uow:
+        for _ in range(3):
+            await uow.create(post_table, post_data)
+        await uow.update(post_table, rows[0]['id'], {'title': 'Title 1'})
+        await uow.update(post_table, rows[1]['id'], {'title': 'Title 2'})
+        await uow.update(post_table, rows[1]['id'], {'title': 'Title 3'})
+        await uow.delete(post_table, rows[2]['id'])
+        assert len(uow.operations) == 4
+        assert len(await post_table.list(**uow.kwargs)) == 3
+    assert uow.operations == []
+
+    result = await post_table.list(order_by='id')
+    assert len(result) == 5
+    assert [row['title'] for row in result[:2]] == ['Title 1', 'Title 3']
+    assert rows[2]['id'] not in [row['id'] for row in result]
+
+
+async def test_database_unit_of_work_hooks(database, post_table, post_data):
+    row = await post_table.create(post_data)
+    post_table.hook_event_mock.reset_mock()
+
+    async with database.unit_of_work() as uow:
+        assert await uow.create(post_table, post_data) is None
+        await uow.update(post_table, row['id'], {'title': 'New Title'})
+        await uow.delete(post_table, row['id'])
+
+    mock = post_table.hook_event_mock
+    mock.pre_create.assert_called_once_with(post_data)
+    assert mock.post_create.call_args[0][0]['id'] != row['id']
+    mock.pre_update.assert_called_once_with(row['id'], {'title': 'New Title'})
+    assert mock.post_update.call_args[0][0]['title'] == 'New Title'
+    mock.pre_delete.assert_called_once_with(row['id'])
+    mock.post_delete.assert_called_once_with(row['id'])
+
+
+async def test_database_unit_of_work_rollback(database, post_table, post_data):
+    with pytest.raises(ZeroDivisionError):
+        async with database.unit_of_work() as uow:
+            await uow.create(post_table, post_data)
+            await uow.flush()
+            await uow.create(post_table, post_data)
+            1 / 0
+    assert uow.operations == []
+
+    with pytest.raises(asyncpg.UndefinedColumnError):
+        async with database.unit_of_work() as uow:
+            await uow.create(post_table, post_data)
+            await uow.create(post_table, {'invalid': 1})
+    assert await post_table.list() == []
+
+
+async def test_database_unit_of_work_without_defer(pool_database, pool_post_table, post_data):
+    await pool_database.init_pool()
+    async with pool_database.unit_of_work(defer=False) as uow:
+        row = await uow.create(pool_post_table, post_data)
+        row = await uow.update(pool_post_table, row['id'], {'title': 'New Title'})
+        assert row['title'] == 'New Title'
+        assert await uow.delete(pool_post_table, row['id']) is True
+        assert uow.operations == []
+    assert await pool_post_table.list() == []
@@ -0,0 +1,102 @@
+import pytest
+
+from asyncpg_utils.builders import Select
+from asyncpg_utils.filters import Q, parse_filter
+
+
+def build(q):
+    return Select('t', where=q.build_where()).build(), q.get_values()
+
+
+def test_parse_filter():
+    assert parse_filter('a') == ('a', 'exact')
+    assert parse_filter('a__b__in') == ('a__b', 'in')
+
+
+def test_q_lookups():
+    assert build(Q(a=1, b__not_in=[1, 2])) == (
+        'SELECT * FROM t WHERE a = $1 AND b <> all($2)', [1, [1, 2]]
+    )
+    assert build(Q(a__between=(1, 5), b__isnull=True, c__isnull=False)) == (
+        'SELECT * FROM t WHERE a BETWEEN $1 AND $2 AND b IS NULL AND c IS NOT NULL',
+        [1, 5]
+    )
+    assert build(Q(data__contains='{"a": 1}', tags__overlap=['x'], ids__contained_by=[1])) == (
+        'SELECT * FROM t WHERE data @> $1 AND ids <@ $2 AND tags && $3',
+        ['{"a": 1}', [1], ['x']]
+    )
+
+
+def test_q_tree():
+    q = (Q(a=1) | Q(b=2)) & Q(c__gt=3)
+    assert build(q) == (
+        'SELECT * FROM t WHERE (a = $1 OR b = $2) AND c > $3', [1, 2, 3]
+    )
+    q = ~Q(a=1, b=2) | Q(c__isnull=True)
+    assert build(q) == (
+        'SELECT * FROM t WHERE NOT (a = $1 AND b = $2) OR c IS NULL', [1, 2]
+    )
+    assert build(~Q(a=1)) == ('SELECT * FROM t WHERE NOT (a = $1)', [1])
+
+
+def test_q_empty_children():
+    assert build(Q() & Q(a=1)) == ('SELECT * FROM t WHERE a = $1', [1])
+    assert build(Q(a=1) | Q()) == ('SELECT * FROM t WHERE a = $1', [1])
+    assert build(Q(Q(), a=1, b=2) | Q(c=3)) == (
+        'SELECT * FROM t WHERE (a = $1 AND b = $2) OR c = $3', [1, 2, 3]
+    )
+    assert build(~Q()) == ('SELECT * FROM t', [])
+    assert build(~(Q() | Q())) == ('SELECT * FROM t', [])
+    assert not ~Q()
+
+
+def test_q_shape():
+    assert (Q(a=1) | Q(b=2)).get_shape() == (Q(a=3) | Q(b=4)).get_shape()
+    assert (Q(a=1) | Q(b=2)).get_shape() != (Q(a=1) & Q(b=2)).get_shape()
+    assert Q(a=1).get_shape() != (~Q(a=1)).get_shape()
+    assert Q(a__isnull=True).get_shape() != Q(a__isnull=False).get_shape()
+    assert Q.from_dict({'b': 1, 'a': 2}, 'OR').get_shape() == ('OR', False, ('b', 'a'))
+
+
+def test_q_errors():
+    with pytest.raises(TypeError):
+        Q(a=1) & {'b': 1}
+    with pytest.raises(ValueError):
+        Q(a__between=(1, 2, 3)).get_values()
+    with pytest.raises(ValueError):
+        Q(a__invalid=1).build_where()
+
+
+def test_q_repr():
+    assert repr(~Q(a=1)) == "<Q: NOT AND [<Q: AND [('a', 1)]>]>"
+    assert not Q()
+
+
+def test_q_set_lookups():
+    column_types = {'id': 'integer'}
+    q = Q(id__in=[1, 2, 3], title__in=['a', 'b', 'c'])
+    assert q.has_set_lookups(2) is True
+    assert q.has_set_lookups(3) is False
+    assert q.get_shape(2, column_types) == (
+        'AND', False, (('id__in', 'set'), 'title__in')
+    )
+    assert q.get_shape(2) == Q(id__in=[], title__in=[]).get_shape()
+    assert Select('posts', where=q.build_where(2, column_types)).build() == (
+        'SELECT * FROM posts WHERE id IN (SELECT unnest($1::integer[])) '
+        'AND title = any($2)'
+    )
+    assert (Q(a=1) | q).has_set_lookups(2) is True
+    assert (Q(a=1) | Q(b=2)).has_set_lookups(2) is False
+    assert q.has_set_lookups(None) is False
+
+
+def test_q_set_lookups_qualified_fields():
+    column_types = {'id': 'integer', 'title': 'character varying(128)'}
+    q = Q(**{'posts.id__in': [1, 2, 3], 'comments.title__in': ['a', 'b', 'c']})
+    assert q.get_shape(2, column_types, 'posts') == (
+        'AND', False, ('comments.title__in', ('posts.id__in', 'set'))
+    )
+    assert Select('posts', where=q.build_where(2, column_types, 'posts')).build() == (
+        'SELECT * FROM posts WHERE comments.title = any($1) '
+        'AND posts.id IN (SELECT unnest($2::integer[]))'
+    )
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from asyncpg_utils.loaders import DetailLoader
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_detail_loader(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+    ids = [row['id'] for row in rows]
+    loader = DetailLoader(post_table)
+
+    results = await asyncio.gather(
+        loader.load(ids[0]), loader.load(ids[1]), loader.load(ids[0]), loader.load(0)
+    )
+    assert results == [rows[0], rows[1], rows[0], None]
+    assert loader.batches == 1
+    assert post_table.hook_event_mock.pre_list.call_count == 1
+    post_table.hook_event_mock.pre_list.assert_called_with(
+        None, {'id__in': [ids[0], ids[1], 0]}, None, 'ASC', False, None, None
+    )
+
+    assert await loader.load_many(ids) == rows
+    assert loader.batches == 2
+    assert await loader.load(ids[0]) == rows[0]
+    assert loader.batches == 2
+
+    loader.clear(ids[0])
+    assert await loader.load(ids[0]) == rows[0]
+    assert loader.batches == 3
+    loader.clear()
+    assert loader.futures == {}
+
+
+async def test_detail_loader_options(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+    ids = [row['id'] for row in rows]
+    loader = DetailLoader(post_table, fields=['title'], cache=False, max_batch_size=2)
+
+    results = await loader.load_many(ids)
+    assert [row['id'] for row in results] == ids
+    assert results[0]['title'] == post_data['title']
+    assert 'body' not in results[0]
+    assert loader.batches == 2
+    assert loader.futures == {}
+
+
+async def test_detail_loader_error(post_table):
+    loader = DetailLoader(post_table, pk_field='invalid')
+
+    with pytest.raises(Exception):
+        await loader.load(1)
+    assert loader.futures == {}
@@ -1,8 +1,14 @@
+import asyncio
+import logging
 from contextlib import suppress
 from datetime import datetime
 
 import pytest
 
+from asyncpg_utils.caches import MemoryCache
+from asyncpg_utils.filters import Q
+from asyncpg_utils.managers import AbstractHook, TableManager
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -212,6 +218,11 @@ async def test_post_table_list_with_limit_offset(post_table, post_data):
     assert len(rows) == 1
     assert rows[0]['title'] == post2_row['title']
 
+    sql_cache_size = len(post_table.sql_cache)
+    for offset in range(2, 5):
+        assert await post_table.list(limit=1, offset=offset) == []
+    assert len(post_table.sql_cache) == sql_cache_size
+
 
 async def test_post_table_list_with_joins(post_table, comment_table, post_data, comment_data):
     fields = (
@@ -339,3 +350,421 @@ async def test_hook_trigger_invalid_event(post_table, post_data):
 async def test_post_table_parse_filters(filters, expected_result, post_table):
     result = post_table.parse_filters(filters)
     assert result == expected_result
+
+
+async def test_post_table_sql_cache(post_table, post_data):
+    await post_table.create(post_data)
+    await post_table.create(post_data)
+    assert post_table.sql_cache.misses == 1
+    assert post_table.sql_cache.hits == 1
+
+    await post_table.list(filters={'title': 'Title 1'})
+    await post_table.list(filters={'title': 'Title 2'})
+    await post_table.list(filters={'title__like': '%Title%'})
+    assert post_table.sql_cache.misses == 3
+    assert post_table.sql_cache.hits == 2
+
+
+async def test_post_table_sql_cache_eviction(database, post_data):
+    post_table = TableManager(database, 'posts', sql_cache_size=1)
+    row = await post_table.create(post_data)
+    await post_table.detail(row['id'])
+    await post_table.create(post_data)
+    assert post_table.sql_cache.evictions == 2
+    assert post_table.sql_cache.hits == 0
+    assert len(post_table.sql_cache) == 1
+
+
+async def test_post_table_list_with_same_field_filters(post_table, post_data):
+    post1_data = post_data.copy()
+    post2_data = post_data.copy()
+    post1_data['pub_date'] = datetime(2018, 1, 1, 0, 0, 0)
+    post2_data['pub_date'] = datetime(2018, 1, 3, 0, 0, 0)
+    post1_row = await post_table.create(post1_data)
+    post2_row = await post_table.create(post2_data)
+    rows = await post_table.list(filters={
+        'pub_date__gt': datetime(2018, 1, 2, 0, 0, 0),
+        'pub_date__lt': datetime(2018, 1, 4, 0, 0, 0),
+    })
+    assert len(rows) == 1
+    assert post1_row not in rows
+    assert post2_row in rows
+
+
+async def test_post_table_bulk_create(post_table, post_data):
+    assert await post_table.bulk_create([post_data] * 3, batch_size=2) == 3
+    assert post_table.hook_event_mock.pre_bulk_create.call_count == 2
+    assert post_table.hook_event_mock.post_bulk_create.call_count == 2
+    post_table.hook_event_mock.post_bulk_create.assert_called_with(1)
+
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+    assert len(rows) == 3
+    assert rows[0]['title'] == post_data['title']
+    assert len(await post_table.list()) == 6
+
+
+async def test_post_table_bulk_update(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+    update_rows = [
+        {'id': row['id'], 'title': 'Title {}'.format(row['id'])} for row in rows
+    ]
+    assert await post_table.bulk_update(update_rows, batch_size=2) == 3
+    for row in rows:
+        selected_row = await post_table.detail(row['id'])
+        assert selected_row['title'] == 'Title {}'.format(row['id'])
+        assert selected_row['body'] == post_data['body']
+
+    update_rows = [
+        {'title': 'Title {}'.format(row['id']), 'body': 'New Body'} for row in rows[:2]
+    ]
+    updated_rows = await post_table.bulk_update(update_rows, key='title', returning=True)
+    assert len(updated_rows) == 2
+    assert all(row['body'] == 'New Body' for row in updated_rows)
+    assert post_table.column_types['title'] == 'character varying(128)'
+
+
+async def test_post_table_bulk_update_mismatched_rows(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 2, returning=True)
+    with pytest.raises(ValueError):
+        await post_table.bulk_update([
+            {'id': rows[0]['id'], 'title': 'a'},
+            {'id': rows[1]['id'], 'title': 'b', 'body': 'Lost'}
+        ])
+    with pytest.raises(ValueError):
+        await post_table.bulk_update([
+            {'id': rows[0]['id'], 'title': 'a'}, {'id': rows[1]['id']}
+        ])
+    with pytest.raises(ValueError):
+        await post_table.bulk_update([{'id': rows[0]['id']}])
+    assert await post_table.list(order_by='id') == rows
+
+
+async def test_post_table_upsert(post_table, post_data):
+    row = await post_table.create(post_data)
+    rows = await post_table.upsert(
+        [{'id': row['id'], 'title': 'Title 1'}, {'id': row['id'] + 1, 'title': 'Title 2'}],
+        returning=True
+    )
+    assert len(rows) == 2
+    assert rows[0]['id'] == row['id']
+    assert rows[0]['title'] == 'Title 1'
+    assert rows[0]['body'] == post_data['body']
+    assert rows[1]['title'] == 'Title 2'
+
+    count = await post_table.upsert(
+        [{'id': row['id'], 'title': 'Title 3'}], conflict_target=['id'], update_fields=()
+    )
+    assert count == 0
+    assert (await post_table.detail(row['id']))['title'] == 'Title 1'
+
+
+async def test_post_table_iterate(post_table, post_data):
+    await post_table.bulk_create([post_data] * 3)
+    rows = []
+    async with post_table.iterate(
+            fields=['id', 'title'], filters={'title': post_data['title']}, order_by='id', prefetch=2) as stream:
+        async for row in stream:
+            rows.append(row)
+    assert len(rows) == 3
+    assert rows[0]['id'] < rows[1]['id'] < rows[2]['id']
+    assert 'body' not in rows[0]
+
+
+@pytest.mark.parametrize('order_by_sort', ['ASC', 'DESC'])
+async def test_post_table_paginate(post_table, post_data, order_by_sort):
+    posts_data = []
+    for index in range(5):
+        data = post_data.copy()
+        data['pub_date'] = datetime(2018, 1, 1 + index // 2, 0, 0, 0)
+        posts_data.append(data)
+    created_rows = await post_table.bulk_create(posts_data, returning=True)
+    expected_ids = [
+        row['id'] for row in sorted(
+            created_rows, key=lambda row: (row['pub_date'], row['id']),
+            reverse=order_by_sort == 'DESC'
+        )
+    ]
+
+    ids = []
+    token = None
+    while True:
+        rows, token = await post_table.paginate(
+            2, filters={'title': post_data['title']}, order_by='pub_date',
+            order_by_sort=order_by_sort, token=token
+        )
+        ids.extend(row['id'] for row in rows)
+        if token is None:
+            break
+    assert ids == expected_ids
+
+    rows = await post_table.list(order_by='pub_date', after=(datetime(2018, 1, 2, 0, 0, 0), 0))
+    assert [row['id'] for row in rows] == sorted(expected_ids)[2:]
+
+    rows, token = await post_table.paginate(10)
+    assert [row['id'] for row in rows] == sorted(expected_ids)
+    assert token is None
+
+    rows, token = await post_table.paginate(3, fields=['title'])
+    assert [row['id'] for row in rows] == sorted(expected_ids)[:3]
+    rows, token = await post_table.paginate(3, fields=['id', 'title'], token=token, result_type='tuple')
+    assert rows == [(row_id, post_data['title']) for row_id in sorted(expected_ids)[3:]]
+    assert token is None
+
+
+async def test_post_table_cache(database, post_data):
+    cache = MemoryCache()
+    post_table = TableManager(database, 'posts', cache=cache)
+    row = await post_table.create(post_data)
+    queries = []
+    database.add_observer(queries.append)
+
+    assert await post_table.detail(row['id']) == row
+    assert await post_table.detail(row['id']) == row
+    assert len(queries) == 1
+    assert len(await post_table.list()) == 1
+    assert len(await post_table.list()) == 1
+    assert len(queries) == 2
+
+    updated_row = await post_table.update(row['id'], {'title': 'New Title'})
+    assert await post_table.detail(row['id']) == updated_row
+    assert (await post_table.list())[0] == updated_row
+    assert len(queries) == 5
+
+    await post_table.bulk_update([{'id': row['id'], 'title': 'Bulk Title'}])
+    assert (await post_table.detail(row['id']))['title'] == 'Bulk Title'
+    await post_table.bulk_update([{'title': 'Bulk Title', 'body': 'Bulk Body'}], key='title')
+    assert (await post_table.detail(row['id']))['body'] == 'Bulk Body'
+    await post_table.bulk_create([post_data])
+    assert len(await post_table.list()) == 2
+
+    await post_table.delete(row['id'])
+    assert await post_table.detail(row['id']) is None
+    assert len(await post_table.list()) == 1
+    assert await post_table.detail(row['id'], fields=['id']) is None
+
+
+class SlowHook(AbstractHook):
+    events = []
+
+    async def post_create(self, row):
+        await asyncio.sleep(0.01)
+        self.events.append(row['id'])
+
+
+class EventHook(AbstractHook):
+    events = []
+
+    async def trigger_event(self, event_name, *args, **kwargs):
+        self.events.append(event_name)
+
+
+async def test_post_table_hook_handlers(database, post_table):
+    assert len(post_table.get_hook_handlers('post_create')) == 1
+    assert post_table.get_hook_handlers('invalid_event') == ()
+
+    no_hooks_table = TableManager(database, 'posts')
+    assert not any(no_hooks_table.hook_handlers.values())
+
+    event_table = TableManager(database, 'posts', hooks=(EventHook,))
+    await event_table.trigger_hooks('custom_event', 1)
+    assert EventHook.events == ['custom_event']
+
+
+async def test_post_table_concurrent_hooks(database, post_data):
+    SlowHook.events = []
+    post_table = TableManager(
+        database, 'posts', hooks=(SlowHook, SlowHook), concurrent_hooks=True
+    )
+    row = await post_table.create(post_data)
+    assert SlowHook.events == [row['id'], row['id']]
+
+
+async def test_post_table_background_hooks(database, post_data):
+    SlowHook.events = []
+    post_table = TableManager(
+        database, 'posts', hooks=(SlowHook,), background_hooks=True,
+        hooks_backlog=1
+    )
+    row = await post_table.create(post_data)
+    assert SlowHook.events == []
+    await post_table.wait_hooks()
+    assert SlowHook.events == [row['id']]
+    assert post_table.hooks_worker is None
+
+    await post_table.trigger_hooks('post_create', {'id': 1})
+    await post_table.trigger_hooks('post_create', {'id': 2})
+    assert SlowHook.events == [row['id'], 2]
+    await post_table.wait_hooks()
+    assert SlowHook.events == [row['id'], 2, 1]
+
+
+async def test_post_table_background_hooks_failure(database, post_data, caplog):
+    post_table = TableManager(
+        database, 'posts', hooks=(SlowHook,), background_hooks=True
+    )
+    with caplog.at_level(logging.ERROR):
+        await post_table.trigger_hooks('post_create', None)
+        await post_table.wait_hooks()
+    assert 'background hooks failed' in caplog.records[0].getMessage()
+
+
+async def test_post_table_delete_many(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+    assert await post_table.delete_many([row['id'] for row in rows[:2]]) == 2
+    assert await post_table.list() == [rows[2]]
+
+
+async def test_post_table_export(post_table, post_data, tmpdir):
+    rows = await post_table.bulk_create([post_data] * 3, returning=True)
+
+    path = str(tmpdir.join('posts.csv'))
+    count = await post_table.export(
+        path, fields=['id', 'title'], filters={'id__gt': rows[0]['id']},
+        order_by='id', header=True
+    )
+    assert count == 2
+    with open(path) as f:
+        assert f.read() == 'id,title\n{},{}\n{},{}\n'.format(
+            rows[1]['id'], post_data['title'], rows[2]['id'], post_data['title']
+        )
+
+    class Writer:
+        def __init__(self):
+            self.chunks = []
+
+        async def write(self, data):
+            self.chunks.append(data)
+
+    writer = Writer()
+    assert await post_table.export(writer, format='binary') == 3
+    assert b''.join(writer.chunks).startswith(b'PGCOPY\n')
+
+
+async def test_post_table_list_as_columns(post_table, post_data):
+    rows = await post_table.bulk_create([post_data] * 2, returning=True)
+    columns = await post_table.list(fields=['id', 'title'], order_by='id', as_columns=True)
+    assert list(columns['id']) == [row['id'] for row in rows]
+    assert columns['title'] == [post_data['title']] * 2
+
+
+async def test_post_table_result_type(post_table, post_data):
+    row = await post_table.create(post_data)
+    rows = await post_table.list(fields=['id', 'title'], result_type='slots')
+    assert (rows[0].id, rows[0].title) == (row['id'], row['title'])
+    detail = await post_table.detail(row['id'], result_type='namedtuple')
+    assert detail.title == row['title']
+    assert await post_table.detail(0, result_type='tuple') is None
+
+
+async def test_post_table_list_with_q_filters(post_table, post_data):
+    post1_row = await post_table.create(post_data)
+    post2_row = await post_table.create(dict(post_data, title='Other', body=None))
+    post3_row = await post_table.create(dict(post_data, title='Another'))
+
+    rows = await post_table.list(
+        filters=(Q(title='Other') | Q(id=post1_row['id'])) & Q(id__gte=post1_row['id']),
+        order_by='id'
+    )
+    assert rows == [post1_row, post2_row]
+    rows = await post_table.list(filters=Q(body__isnull=True))
+    assert rows == [post2_row]
+    rows = await post_table.list(filters=~Q(body__isnull=True), order_by='id')
+    assert rows == [post1_row, post3_row]
+    rows = await post_table.list(
+        filters=Q(id__between=(post2_row['id'], post3_row['id']), id__not_in=[post3_row['id']])
+    )
+    assert rows == [post2_row]
+    assert await post_table.list(filters=Q() & Q(id=post1_row['id'])) == [post1_row]
+    assert len(await post_table.list(filters=~Q())) == 3
+    sql_cache_size = len(post_table.sql_cache)
+    await post_table.list(filters=Q(body__isnull=True))
+    assert len(post_table.sql_cache) == sql_cache_size
+
+
+async def test_post_table_large_in_filters(database, post_data):
+    post_table = TableManager(database, 'posts', in_threshold=2)
+    rows = await post_table.bulk_create([post_data] * 4, returning=True)
+    ids = [row['id'] for row in rows]
+
+    assert await post_table.list(filters={'id__in': ids[:2]}, order_by='id') == rows[:2]
+    assert post_table.column_types is None
+    assert await post_table.list(filters={'id__in': ids[:3]}, order_by='id') == rows[:3]
+    assert post_table.column_types is not None
+    assert any('unnest($1::integer[])' in sql_query for sql_query in post_table.sql_cache.data.values())
+
+    assert await post_table.update_many(ids[:2], {'title': 'Small'}) == 2
+    updated_rows = await post_table.update_many(ids[1:], {'title': 'Large'}, returning=True)
+    assert sorted(row['id'] for row in updated_rows) == ids[1:]
+    assert [row['title'] for row in await post_table.list(order_by='id')] == [
+        'Small', 'Large', 'Large', 'Large'
+    ]
+
+    assert await post_table.delete_many(ids[1:]) == 3
+    assert await post_table.delete_many(ids) == 1
+    assert await post_table.list() == []
+
+    post_table = TableManager(database, 'posts', in_threshold=None)
+    assert await post_table.list(filters={'id__in': ids}) == []
+
+
+async def test_post_table_large_in_filters_with_connection(database, post_data):
+    rows = await TableManager(database, 'posts').bulk_create([post_data] * 3, returning=True)
+    ids = [row['id'] for row in rows]
+    conn = await database.get_connection()
+    post_table = TableManager(database, 'posts', in_threshold=2)
+    assert len(await post_table.list(filters={'id__in': ids}, connection=conn)) == 3
+    assert conn.is_closed()
+
+    conn = await database.get_connection()
+    post_table = TableManager(database, 'posts', in_threshold=2)
+    assert await post_table.delete_many(ids, connection=conn) == 3
+    assert conn.is_closed()
+
+
+async def test_post_table_cache_evicts_after_commit(database, post_data):
+    post_table = TableManager(database, 'posts', cache=MemoryCache())
+    row = await post_table.create(post_data)
+
+    async with database.unit_of_work(defer=False) as uow:
+        await uow.update(post_table, row['id'], {'title': 'Title 1'})
+        assert (await post_table.detail(row['id']))['title'] == post_data['title']
+    assert (await post_table.detail(row['id']))['title'] == 'Title 1'
+
+    conn = await database.get_connection()
+    async with conn.transaction():
+        await post_table.update(row['id'], {'title': 'Title 2'}, connection=conn, close_connection=False)
+        assert (await post_table.list())[0]['title'] == 'Title 1'
+    await database.release_connection(conn)
+    assert (await post_table.list())[0]['title'] == 'Title 2'
+    assert not database.after_transaction
+
+
+async def test_post_table_cache_returns_copies(database, post_data):
+    post_table = TableManager(database, 'posts', cache=MemoryCache())
+    await post_table.create(post_data)
+
+    rows = await post_table.list()
+    rows.clear()
+    rows = await post_table.list()
+    assert len(rows) == 1
+    rows.clear()
+    assert len(await post_table.list()) == 1
+
+
+async def test_post_table_cache_shared_generations(database, post_data):
+    cache = MemoryCache()
+    post_table1 = TableManager(database, 'posts', cache=cache)
+    post_table2 = TableManager(database, 'posts', cache=cache)
+    row = await post_table1.create(post_data)
+
+    assert await post_table1.detail(row['id']) == row
+    assert len(await post_table1.list()) == 1
+    await post_table2.evict_cache(None)
+    await database.query('DELETE FROM posts')
+    assert await post_table1.detail(row['id']) is None
+    assert await post_table1.list() == []
+
+    row = await post_table1.create(post_data)
+    assert await post_table1.detail(row['id']) == row
+    await post_table2.delete(row['id'])
+    assert await post_table1.detail(row['id']) is None
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from asyncpg_utils.databases import Database, PoolDatabase
+from asyncpg_utils.metrics import Histogram, MemoryMetricsCollector, NullMetricsCollector
+
+from .conftest import dsn
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    assert histogram.info() == {
+        'buckets': {1: 2, 5: 1, float('inf'): 1},
+        'count': 4,
+        'sum': 14.5,
+    }
+
+
+def test_null_metrics_collector():
+    metrics = NullMetricsCollector()
+    assert metrics.enabled is False
+    assert metrics.observe_acquire(1) is None
+    assert metrics.observe_query('SELECT 1', 1) is None
+    assert metrics.increment_timeout('query') is None
+    assert metrics.set_connections(1, 1) is None
+
+
+def test_memory_metrics_collector_max_statements():
+    metrics = MemoryMetricsCollector(max_statements=1)
+    metrics.observe_query('SELECT 1', 0.1)
+    metrics.observe_query('SELECT 2', 0.1)
+    metrics.observe_query('SELECT 3', 0.1)
+    assert metrics.query_time['SELECT 1'].count == 1
+    assert metrics.query_time['<other>'].count == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('database_class', [Database, PoolDatabase])
+async def test_database_metrics(database_class):
+    metrics = MemoryMetricsCollector()
+    database = database_class(dsn, metrics=metrics)
+    if isinstance(database, PoolDatabase):
+        await database.init_pool()
+
+    try:
+        await database.query('SELECT 1')
+        await database.query('SELECT 1')
+        conn = await database.get_connection()
+        assert metrics.connections_in_use == 1
+        with pytest.raises(asyncio.TimeoutError):
+            await database.query('SELECT pg_sleep(1)', connection=conn, timeout=0.01, close_connection=False)
+        await database.release_connection(conn)
+
+        info = metrics.info()
+        assert info['acquire_time']['count'] == 3
+        assert info['query_time']['SELECT 1']['count'] == 2
+        assert info['query_time']['SELECT pg_sleep(1)']['count'] == 1
+        assert info['timeouts'] == {'query': 1}
+        assert info['connections_in_use'] == 0
+        if isinstance(database, PoolDatabase):
+            assert info['connections_idle'] == database.pool.get_idle_size()
+        else:
+            assert info['connections_idle'] is None
+    finally:
+        if isinstance(database, PoolDatabase):
+            await database.pool.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('database_class', [Database, PoolDatabase])
+async def test_database_metrics_unpaired_connections(database_class):
+    metrics = MemoryMetricsCollector()
+    database = database_class(dsn, metrics=metrics)
+    if isinstance(database, PoolDatabase):
+        await database.init_pool()
+
+    try:
+        conn = await database.get_connection()
+        assert database.connections_in_use == 1
+        if isinstance(database, PoolDatabase):
+            await database.pool.release(conn)
+        else:
+            await conn.close()
+        assert database.connections_in_use == 0
+
+        if isinstance(database, PoolDatabase):
+            conn = await database.pool.acquire()
+        else:
+            conn = await database.connect()
+        await database.query('SELECT 1', connection=conn, close_connection=True)
+        assert database.connections_in_use == 0
+        assert metrics.connections_in_use == 0
+    finally:
+        if isinstance(database, PoolDatabase):
+            await database.pool.close()
+
+
+@pytest.mark.asyncio
+async def test_database_metrics_acquire_timeout():
+    metrics = MemoryMetricsCollector()
+    database = Database(dsn, metrics=metrics)
+
+    async def connect():
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await database.observe_connection(connect())
+    assert metrics.timeouts == {'acquire': 1}
+    assert metrics.connections_in_use == 0
+
+
+@pytest.mark.asyncio
+async def test_pool_database_metrics_acquire_timeout():
+    metrics = MemoryMetricsCollector()
+    database = PoolDatabase(dsn, metrics=metrics, acquire_timeout=0.1, min_size=1, max_size=1)
+    await database.init_pool()
+    try:
+        async with database.acquire():
+            with pytest.raises(asyncio.TimeoutError):
+                await database.query('SELECT 1')
+        assert metrics.timeouts == {'acquire': 1}
+        assert metrics.connections_in_use == 0
+        assert await database.query_one('SELECT 1 AS value') == (1,)
+    finally:
+        await database.close()
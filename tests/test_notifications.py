@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import pytest
+
+from asyncpg_utils.caches import MemoryCache
+from asyncpg_utils.databases import PoolDatabase
+from asyncpg_utils.managers import TableManager
+from asyncpg_utils.notifications import InvalidationChannel
+
+from .conftest import dsn
+
+pytestmark = pytest.mark.asyncio
+
+
+async def wait_flushes(channel, flushes):
+    for _ in range(100):
+        if channel.flushes == flushes:
+            return
+        await asyncio.sleep(0.01)
+
+
+async def test_invalidation_channel(database, post_data):
+    pool_database = PoolDatabase(dsn, min_size=1, max_size=2)
+    await pool_database.init_pool()
+    listener_channel = InvalidationChannel(pool_database, coalesce_delay=0.01)
+    listener_table = listener_channel.register(TableManager(pool_database, 'posts', cache=MemoryCache()))
+    publisher_channel = InvalidationChannel(database)
+    publisher_table = publisher_channel.register(TableManager(database, 'posts'))
+    await listener_channel.listen()
+    await publisher_channel.listen()
+
+    try:
+        row = await publisher_table.create(post_data)
+        await wait_flushes(listener_channel, 1)
+        assert await listener_table.detail(row['id']) == row
+        assert len(await listener_table.list()) == 1
+
+        await publisher_table.update(row['id'], {'title': 'New Title'})
+        await publisher_table.bulk_update([{'id': row['id'], 'body': 'New Body'}])
+        await wait_flushes(listener_channel, 2)
+        assert listener_channel.received == 3
+        assert listener_channel.flushes == 2
+        assert publisher_channel.published == 3
+        assert publisher_channel.received == 0
+        selected_row = await listener_table.detail(row['id'])
+        assert selected_row['title'] == 'New Title'
+        assert selected_row['body'] == 'New Body'
+        assert (await listener_table.list())[0] == selected_row
+    finally:
+        await listener_channel.close()
+        await publisher_channel.close()
+        await pool_database.pool.close()
+
+
+async def test_invalidation_channel_reconnect(database, post_data):
+    pool_database = PoolDatabase(dsn, min_size=1, max_size=2)
+    await pool_database.init_pool()
+    listener_channel = InvalidationChannel(pool_database, coalesce_delay=0.01, reconnect_delay=0.01)
+    listener_table = listener_channel.register(TableManager(pool_database, 'posts', cache=MemoryCache()))
+    publisher_table = InvalidationChannel(database).register(TableManager(database, 'posts'))
+    await listener_channel.listen()
+
+    try:
+        generation = await listener_table.get_cache_generation('detail')
+        pid = listener_channel.connection.get_server_pid()
+        await database.query('SELECT pg_terminate_backend($1)', pid)
+        for _ in range(100):
+            if listener_channel.reconnects:
+                break
+            await asyncio.sleep(0.01)
+        assert listener_channel.reconnects == 1
+        assert listener_channel.connection.get_server_pid() != pid
+        assert await listener_table.get_cache_generation('detail') != generation
+
+        await publisher_table.create(post_data)
+        await wait_flushes(listener_channel, 1)
+        assert listener_channel.received == 1
+    finally:
+        await listener_channel.close()
+        await pool_database.pool.close()
+
+
+async def test_invalidation_channel_coalesce(database):
+    channel = InvalidationChannel(database, coalesce_delay=10)
+    table_manager = channel.register(TableManager(database, 'posts', cache=MemoryCache()))
+
+    def notify(pks):
+        payload = json.dumps({'origin': 'other', 'table': 'posts', 'pks': pks})
+        channel.on_notification(None, 1, channel.channel, payload)
+
+    notify([1, 2])
+    notify([2, 3])
+    assert channel.pending == {'posts': {1, 2, 3}}
+    notify(None)
+    notify([4])
+    assert channel.pending == {'posts': None}
+
+    generation = await table_manager.get_cache_generation('detail')
+    await channel.flush()
+    assert channel.pending == {}
+    assert await table_manager.get_cache_generation('detail') != generation
+    await channel.close()
+    assert channel.flush_handle is None
+
+
+def test_invalidation_channel_payload_size(database):
+    channel = InvalidationChannel(database)
+    payload = json.loads(channel.encode_payload('posts', list(range(5000))))
+    assert payload['pks'] is None
+    payload = json.loads(channel.encode_payload('posts', [1]))
+    assert payload['pks'] == [1]
@@ -0,0 +1,76 @@
+import logging
+
+import pytest
+
+from asyncpg_utils.databases import PoolDatabase
+from asyncpg_utils.observers import QueryEvent, SlowQueryLogger, get_row_count
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_event(duration=1.0, error=None):
+    return QueryEvent('fetch', 'SELECT\n  1', 0, 1, 123, 0.01, duration, error)
+
+
+def test_get_row_count():
+    assert get_row_count('fetch', [1, 2]) == 2
+    assert get_row_count('fetchrow', {'id': 1}) == 1
+    assert get_row_count('fetchrow', None) == 0
+    assert get_row_count('execute', 'UPDATE 3') == 3
+    assert get_row_count('execute', 'CREATE TABLE') is None
+
+
+def test_slow_query_logger(caplog):
+    observer = SlowQueryLogger(threshold=0.5)
+    with caplog.at_level(logging.WARNING):
+        observer(make_event(duration=0.1))
+        observer(make_event(duration=1.0))
+    assert len(caplog.records) == 1
+    assert 'sql_query=SELECT 1' in caplog.records[0].getMessage()
+
+
+def test_slow_query_logger_sample_rate(caplog):
+    observer = SlowQueryLogger(threshold=0, sample_rate=0)
+    with caplog.at_level(logging.WARNING):
+        observer(make_event())
+    assert not caplog.records
+
+
+@pytest.mark.parametrize('db', [
+    pytest.lazy_fixture('database'),
+    pytest.lazy_fixture('pool_database'),
+])
+async def test_database_observers(db):
+    if isinstance(db, PoolDatabase):
+        await db.init_pool()
+    events = []
+    db.add_observer(events.append)
+
+    await db.query('SELECT generate_series(1, $1)', 3)
+    await db.execute('SELECT 1')
+    conn = await db.get_connection()
+    with pytest.raises(Exception):
+        await db.query_one('SELECT 1 / 0', connection=conn, close_connection=False)
+    await db.release_connection(conn)
+
+    assert [event.row_count for event in events] == [3, 1, 0]
+    assert events[0].args_count == 1
+    assert events[0].sql_query == 'SELECT generate_series(1, $1)'
+    assert all(event.connection_id for event in events)
+    assert all(event.duration >= 0 and event.wait_time >= 0 for event in events)
+    assert events[2].error is not None
+    assert events[2].wait_time < events[0].wait_time + 1
+
+    db.remove_observer(events.append)
+    await db.query('SELECT 1')
+    assert len(events) == 3
+
+
+async def test_database_observer_failure(database, caplog):
+    def failing_observer(event):
+        raise RuntimeError('boom')
+
+    database.add_observer(failing_observer)
+    with caplog.at_level(logging.ERROR):
+        assert await database.query('SELECT 1 AS value') == [(1,)]
+    assert 'failed' in caplog.records[0].getMessage()
@@ -0,0 +1,31 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+
+from asyncpg_utils.pagination import decode_token, encode_token
+
+
+@pytest.mark.parametrize('values', [
+    (1, 'title', None, True, 1.5, {'key': 'value'}),
+    (datetime.datetime(2018, 1, 1, 10, 30, 0, 15),),
+    (datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc),),
+    (datetime.date(2018, 1, 1), datetime.time(10, 30)),
+    (decimal.Decimal('10.50'), uuid.uuid4()),
+])
+def test_token_roundtrip(values):
+    token = encode_token(values)
+    assert isinstance(token, str)
+    assert decode_token(token) == values
+
+
+def test_encode_token_unsupported_value():
+    with pytest.raises(TypeError):
+        encode_token([object()])
+
+
+@pytest.mark.parametrize('token', ['invalid', encode_token([{'$type': 'date', 'value': 'x'}])])
+def test_decode_token_invalid(token):
+    with pytest.raises(ValueError):
+        decode_token(token)
@@ -0,0 +1,70 @@
+import array
+import sys
+
+import pytest
+
+from asyncpg_utils.results import map_record, map_records, to_array, to_columns
+
+pytestmark = pytest.mark.asyncio
+
+
+def test_to_array():
+    assert to_array((1, 2)) == array.array('q', [1, 2])
+    assert to_array((1.5, 2)) == array.array('d', [1.5, 2])
+    assert to_array((1, None)) == [1, None]
+    assert to_array((2 ** 64, 1)) == [2 ** 64, 1]
+    assert to_array(('a', 'b')) == ['a', 'b']
+    assert to_array((True, False)) == [True, False]
+
+
+def test_to_array_numpy():
+    numpy = pytest.importorskip('numpy')
+    assert to_array((1, 2), numpy).dtype == numpy.int64
+    assert to_array((1.5, None), numpy) == [1.5, None]
+    assert to_columns([], use_numpy=True) == {}
+
+
+def test_to_columns_without_numpy(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    with pytest.raises(ImportError):
+        to_columns([], use_numpy=True)
+
+
+async def test_to_columns(database):
+    records = await database.query(
+        'SELECT i AS id, i * 0.5::float AS value, i::text AS name '
+        'FROM generate_series(1, 3) AS i'
+    )
+    columns = to_columns(records)
+    assert columns == {
+        'id': array.array('q', [1, 2, 3]),
+        'value': array.array('d', [0.5, 1.0, 1.5]),
+        'name': ['1', '2', '3'],
+    }
+    assert to_columns([], fields=['id']) == {'id': []}
+
+
+async def test_map_records(database):
+    records = await database.query('SELECT 1 AS id, 2 AS "count", 3 AS "1"')
+    assert map_records(records) is records
+    assert map_records(records, 'record') is records
+    assert map_records(records, 'tuple') == [(1, 2, 3)]
+    assert map_records([], 'tuple') == []
+
+    row = map_records(records, 'namedtuple')[0]
+    assert (row.id, row.count, row._2) == (1, 2, 3)
+    assert map_records(records, 'namedtuple')[0].__class__ is row.__class__
+
+    row = map_records(records, 'slots')[0]
+    assert not hasattr(row, '__dict__')
+    assert (row.id, row.count) == (1, 2)
+    assert tuple(row) == (1, 2, 3) and len(row) == 3
+    assert row._asdict() == {'id': 1, 'count': 2, '_2': 3}
+    assert row == map_records(records, 'slots')[0]
+    assert row != (1, 2, 3)
+    assert repr(row) == "Row(id=1, count=2, _2=3)"
+
+    with pytest.raises(ValueError):
+        map_records(records, 'invalid')
+    assert map_record(None, 'tuple') is None
+    assert map_record(records[0], 'tuple') == (1, 2, 3)
@@ -0,0 +1,146 @@
+import pytest
+
+from asyncpg_utils.databases import Database, PoolDatabase
+from asyncpg_utils.managers import TableManager
+from asyncpg_utils import statements
+from asyncpg_utils.statements import StatementRegistry, bind_statement
+
+from .conftest import dsn
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def statement_registry():
+    return StatementRegistry()
+
+
+@pytest.fixture
+def registry_pool_database(statement_registry):
+    return PoolDatabase(dsn, statement_registry=statement_registry, min_size=1, max_size=1)
+
+
+async def test_statement_registry_prepare_and_reuse(registry_pool_database, statement_registry, post_data):
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts')
+    row = await post_table.create(post_data)
+    assert await post_table.detail(row['id']) == row
+    assert await post_table.detail(row['id']) == row
+    assert len(statement_registry.statements) == 2
+    assert statement_registry.prepares == 2
+    assert statement_registry.reuses == 1
+    assert statement_registry.info()['connections'] == 1
+
+    rows = await registry_pool_database.query('SELECT * FROM posts')
+    assert rows == [row]
+    assert statement_registry.prepares == 2
+    await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_invalidation(registry_pool_database, statement_registry):
+    await registry_pool_database.init_pool()
+    conn = await registry_pool_database.get_connection()
+    await conn.execute('CREATE TABLE IF NOT EXISTS registry_test(id serial PRIMARY KEY)')
+    try:
+        sql_query = statement_registry.register('SELECT * FROM registry_test')
+        await registry_pool_database.query(sql_query, connection=conn, close_connection=False)
+        await conn.execute('ALTER TABLE registry_test ADD COLUMN title text')
+        await registry_pool_database.query(sql_query, connection=conn, close_connection=False)
+        assert statement_registry.invalidations == 1
+        assert statement_registry.prepares == 2
+
+        statement_registry.unregister(sql_query)
+        assert sql_query not in statement_registry
+    finally:
+        await conn.execute('DROP TABLE registry_test')
+        await registry_pool_database.pool.release(conn)
+        await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_invalidation_in_transaction(registry_pool_database, statement_registry):
+    await registry_pool_database.init_pool()
+    conn = await registry_pool_database.get_connection()
+    await conn.execute('CREATE TABLE IF NOT EXISTS registry_test(id serial PRIMARY KEY)')
+    try:
+        sql_query = statement_registry.register('SELECT * FROM registry_test')
+        await registry_pool_database.query(sql_query, connection=conn, close_connection=False)
+        await conn.execute('ALTER TABLE registry_test ADD COLUMN title text')
+        with pytest.raises(Exception):
+            async with conn.transaction():
+                await registry_pool_database.query(sql_query, connection=conn, close_connection=False)
+        assert statement_registry.invalidations == 1
+    finally:
+        await conn.execute('DROP TABLE registry_test')
+        await registry_pool_database.pool.release(conn)
+        await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_removes_closed_connections(statement_registry, post_data):
+    database = Database(dsn, statement_registry=statement_registry)
+    post_table = TableManager(database, 'posts')
+    await post_table.create(post_data)
+    await post_table.create(post_data)
+    assert statement_registry.prepares == 2
+    assert statement_registry.reuses == 0
+    assert statement_registry.info()['connections'] == 1
+
+
+async def test_statement_registry_execute(registry_pool_database, statement_registry, post_data):
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts')
+    row = await post_table.create(post_data)
+    assert await post_table.bulk_update([{'id': row['id'], 'title': 'Title'}]) == 1
+    assert await post_table.bulk_update([{'id': row['id'], 'title': 'Title'}]) == 1
+    assert statement_registry.reuses == 1
+    await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_reuses_paginated_queries(registry_pool_database, statement_registry, post_data):
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts', sql_cache_size=2)
+    await post_table.bulk_create([post_data] * 3)
+    for offset in range(1, 3):
+        assert len(await post_table.list(limit=1, offset=offset, order_by='id')) == 1
+    assert len(statement_registry.statements) == 1
+    assert statement_registry.prepares == 1
+    assert statement_registry.reuses == 1
+    await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_unregisters_evicted_queries(registry_pool_database, statement_registry, post_data):
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts', sql_cache_size=1)
+    row = await post_table.create(post_data)
+    insert_query, = statement_registry.statements
+    await post_table.detail(row['id'])
+    assert insert_query not in statement_registry
+    assert statement_registry.info()['statements'] == 1
+    await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_skips_disabled_sql_cache(registry_pool_database, statement_registry, post_data):
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts', sql_cache_size=0)
+    row = await post_table.create(post_data)
+    for _ in range(3):
+        assert await post_table.detail(row['id']) == row
+    assert statement_registry.statements == {}
+    assert statement_registry.prepares == 0
+    await registry_pool_database.pool.close()
+
+
+async def test_statement_registry_prepares_again_without_binding(
+        registry_pool_database, statement_registry, post_data, monkeypatch):
+    monkeypatch.setattr(statements, 'bind_statement', lambda *args: None)
+    await registry_pool_database.init_pool()
+    post_table = TableManager(registry_pool_database, 'posts')
+    row = await post_table.create(post_data)
+    assert await post_table.detail(row['id']) == row
+    assert await post_table.detail(row['id']) == row
+    assert statement_registry.prepares == 3
+    assert statement_registry.reuses == 0
+    await registry_pool_database.pool.close()
+
+
+def test_bind_statement_without_release_counters():
+    assert bind_statement(object(), object(), 'SELECT 1') is None